@@ -1,17 +1,20 @@
 import asyncio
 from pathlib import Path
 
-from steps.split_video import split_video_into_intervals
+from steps.split_video import split_video_into_intervals, interval_keyframe_writer
 from steps.text_removal import remove_text_from_intervals
 from steps.person_detection import detect_and_describe_people
 from steps.reference_generation import generate_reference_images
 from steps.frame_editing import edit_frames
 from steps.video_generation import generate_video_intervals
-from steps.reassembly import reassemble_video
-from steps.extract_text_layer import extract_text_layer
-from steps.add_text_layer import add_text_layer
+from steps.final_render import render_final_video
+from steps.extract_text_layer import TEXT_MASK_FILE, extract_text_layer, text_layer_sampler
+from utils.async_utils import run_cpu, shutdown_cpu_pool
 from utils.config import Config
 from utils.cache_manager import CacheManager
+from utils.mezzanine import create_mezzanine
+from utils.text_layer_library import TextLayerLibrary
+from utils.video_ingest import VideoIngest
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -26,6 +29,11 @@ class VideoLocalizationPipeline:
         self.work_dir.mkdir(parents=True, exist_ok=True)
         self.cache_manager = CacheManager(self.work_dir / "cache")
 
+        self.text_layer_library = None
+        if config.reuse_text_layers:
+            library_dir = config.text_layer_library_dir or self.work_dir / "text_layer_library"
+            self.text_layer_library = TextLayerLibrary(Path(library_dir))
+
     async def run(
         self,
         input_video_path: str,
@@ -45,31 +53,69 @@ class VideoLocalizationPipeline:
         logger.info(f"Input video: {input_video_path}")
         logger.info(f"Transformation theme: {transformation_theme}")
 
+        text_layer_task = None
         try:
-            # Step 0: Extract text layers from video
+            # Optional mezzanine: CFR, short-GOP copy of the source that steps 0 and 1 read
+            source_video_path = input_video_path
+            if self.config.use_mezzanine:
+                logger.info("Transcoding the source into a mezzanine")
+                source_video_path = await create_mezzanine(
+                    input_video_path,
+                    work_dir=self.work_dir / "mezzanine",
+                    config=self.config,
+                    cache_manager=self.cache_manager,
+                )
+
+            # Ingest: decode the video once for the text-layer samples (step 0) and the scene cuts or interval frames (step 1)
+            logger.info("Ingesting video frames for steps 0 and 1")
+            ingest = VideoIngest(source_video_path)
+            # the sampler hashes (cache lookup) and probes the video: off the event loop
+            text_samples = ingest.add(await asyncio.to_thread(
+                text_layer_sampler,
+                source_video_path,
+                spill_dir=self.work_dir / "ingest",
+                cache_manager=self.cache_manager,
+                max_spill_mb=self.config.ingest_spill_max_mb,
+            ))
+            keyframes = ingest.add(await asyncio.to_thread(
+                interval_keyframe_writer,
+                source_video_path,
+                work_dir=self.work_dir / "extracted_frames",
+                interval=self.config.frame_interval,
+                cache_manager=self.cache_manager,
+                config=self.config,
+            ))
+            await asyncio.to_thread(ingest.run)
+
+            # Step 0: Extract text layers from video (in a worker process, overlapping the steps that do not need it)
             logger.info("Step 0: Extracting text layers from video")
-            extract_text_layer(
-                work_dir=self.work_dir / "extracted_text_layer",
-                input_video_path=input_video_path,
-            )
+            text_layer_task = asyncio.create_task(self._extract_text_layer(source_video_path, text_samples))
 
-            # Step 1: Splits video into fixed intervals
+            # Step 1: Splits video into intervals
             video_intervals = await split_video_into_intervals(
-                input_video_path,
+                source_video_path,
                 work_dir=self.work_dir / "extracted_frames",
-                audio_dir=self.work_dir / "extracted_audios",
                 interval=self.config.frame_interval,
                 cache_manager=self.cache_manager,
+                keyframes=keyframes,
+                config=self.config,
             )
             logger.info(f"Extracted {len(video_intervals)} video intervals")
 
             # Step 2: Remove text from all extracted frames in video intervals for better performance
+            # (the local engine needs the step-0 mask)
+            text_mask_path = None
+            if self.config.text_removal_engine == "local":
+                text_layer_path = await text_layer_task
+                text_mask_path = text_layer_path.parent / TEXT_MASK_FILE
             cleaned_video_intervals = await remove_text_from_intervals(
                 video_intervals,
                 work_dir=self.work_dir / "cleaned_frames",
                 config=self.config,
                 input_video_path=input_video_path,
                 cache_manager=self.cache_manager,
+                source_video_path=source_video_path,
+                text_mask_path=text_mask_path,
             )
             logger.info(f"Cleaned {len(cleaned_video_intervals)} video intervals")
 
@@ -113,20 +159,21 @@ class VideoLocalizationPipeline:
             )
             logger.info(f"Generated {len(generated_intervals)} video intervals")
 
-            # Step 7: Reassemble the video
-            logger.info("Step 7: Reassembling video")
-            reassembled_video = await reassemble_video(
-                generated_intervals,
-                self.work_dir / "reassembled_video.mp4",
-            )
-            logger.info(f"Video reassembled: {reassembled_video}")
+            text_layer_path = await text_layer_task
 
-            # Step 8: Add the extracted text layer to the reassembled video
-            logger.info("Step 8: Adding extracted text layer to the reassembled video")
-            final_video = add_text_layer(
-                video_path=reassembled_video,
-                text_layer_path=self.work_dir / "extracted_text_layer" / "text_rgba.png",
+            # Steps 7-8: Reassemble the clips with the text layer and the original audio (one encode)
+            logger.info("Steps 7-8: Rendering the final video with the extracted text layer")
+            final_video = await render_final_video(
+                generated_intervals,
+                text_layer_path=text_layer_path,
                 output_path=self.work_dir / "final_video.mp4",
+                audio_source=input_video_path,
+                audio_start=edited_intervals[0].start_time if edited_intervals else 0.0,
+                config=self.config,
+                shared_start=[
+                    i > 0 and interval.start_frame_path == edited_intervals[i - 1].end_frame_path
+                    for i, interval in enumerate(edited_intervals)
+                ],
             )
             logger.info(f"Final video with text layer: {final_video}")
 
@@ -134,8 +181,25 @@ class VideoLocalizationPipeline:
 
         except Exception as e:
             logger.error(f"Pipeline failed: {str(e)}", exc_info=True)
+            if text_layer_task and not text_layer_task.done():
+                text_layer_task.cancel()
             raise
 
+    async def _extract_text_layer(self, source_video_path: str, text_samples) -> Path:
+        """Step 0 in the shared process pool; drops the ingest samples once it is done"""
+        try:
+            return await run_cpu(
+                extract_text_layer,
+                work_dir=self.work_dir / "extracted_text_layer",
+                input_video_path=source_video_path,
+                cache_manager=self.cache_manager,
+                library=self.text_layer_library,
+                samples=text_samples,
+            )
+        finally:
+            if text_samples:
+                text_samples.release()
+
 
 async def main():
     """Example usage"""
@@ -146,10 +210,13 @@ async def main():
     # Example demographic description
     transformation_theme = "Black people"
 
-    result = await pipeline.run(
-        input_video_path="assets/video.mp4",
-        transformation_theme=transformation_theme,
-    )
+    try:
+        result = await pipeline.run(
+            input_video_path="assets/video.mp4",
+            transformation_theme=transformation_theme,
+        )
+    finally:
+        shutdown_cpu_pool()
 
     print(f"Video localization complete: {result}")
 
@@ -12,6 +12,8 @@ class VideoInterval(BaseModel):
     duration: float
     fps: float
     audio_path: Optional[str] = None
+    start_frame: Optional[int] = None  # Source frame numbers of the keyframes
+    end_frame: Optional[int] = None
 
 
 class Person(BaseModel):
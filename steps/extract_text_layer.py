@@ -1,14 +1,53 @@
 import os
+import shutil
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 import cv2
 import numpy as np
 from utils.logger import setup_logger
+from utils.cache_manager import CacheManager
+from utils.mezzanine import load_frame_index
+from utils.text_layer_library import TextLayerLibrary
+from utils.video_ingest import FrameConsumer
 from pathlib import Path
 
 logger = setup_logger(__name__)
 
 # ---------------------- Tunable parameters (color-agnostic) ----------------------
 SAMPLE_MAX_FRAMES = 240                         # maximum frames to sample
-SAMPLE_STRIDE = 2                               # sample every N-th frame
+SAMPLE_STRIDE = 2                               # sample every N-th frame (minimum stride when spreading)
+SAMPLE_SPREAD = True                            # widen the stride so samples cover the whole video
+SAMPLE_DECODER = "opencv"                       # "opencv" | "ffmpeg" (raw pipe; scaling/gray done by ffmpeg)
+SEEK_MIN_GAP = 48                               # frames; shorter gaps are walked with grab() instead of a seek
+
+# Early stopping (mask convergence)
+CONVERGE_EARLY_STOP = True                      # stop sampling once the running text mask stops changing
+CONVERGE_ROUNDS = 4                             # interleaved rounds; each spans the whole sampled range
+SAMPLE_MIN_FRAMES = 60                          # floor on the sample count (ceiling is SAMPLE_MAX_FRAMES)
+CONVERGE_CHECK_EVERY = 16                       # samples between running-mask comparisons
+CONVERGE_IOU = 0.97                             # successive running masks must be at least this similar ...
+CONVERGE_PATIENCE = 2                           # ... for this many checks in a row
+STREAMING_STATS = True                          # fold frames into running accumulators instead of (T,H,W) stacks
+
+# Stabilization
+ORB_FEATURES = 2000
+STABILIZE_MAX_DIM = 640                         # estimate transforms on the pyramid level whose longest side fits this
+STABILIZE_WORKERS = os.cpu_count() or 1         # processes for per-frame estimate + warp (1 -> serial)
+STABILIZE_IN_FLIGHT = 2                         # queued frames per worker (bounds memory while streaming)
+
+# Coarse-to-fine ROI detection
+ROI_DETECTION = False                           # find candidates on a proxy, fold full-res stats only inside them (opt-in: not yet faster)
+ROI_PROXY_SCALE = 0.25                          # proxy resolution of the coarse pass
+ROI_PAD = 24                                    # full-res pixels of padding around each candidate box
+ROI_MAX_AREA_FRAC = 0.5                         # above this coverage, use a single full-frame ROI
+
+# Overlay colour
+OVERLAY_HIST_MAX_MB = 512                       # budget for collecting colour histograms during the ROI pass
+
+# Layer library
+LIBRARY_PROBE_FRAMES = 6                        # frames sampled across the video to match known layers
 
 # Gradient / persistence
 GAUSS_BLUR = 1                                  # 0/1 -> small denoise before Sobel
@@ -32,92 +71,588 @@ MAX_COMPONENT_AREA_FRAC = 0.06   # drop components larger than this fraction of
 
 # ---------------------------------------------------------------------------------
 
-def read_sampled_frames(path, max_frames=SAMPLE_MAX_FRAMES, stride=SAMPLE_STRIDE):
+TEXT_LAYER_FILE = "text_rgba.png"
+TEXT_MASK_FILE = "text_mask.png"
+
+# tunables that only change how fast the layer is computed, not the layer itself
+_RUNTIME_ONLY_PARAMS = {"STABILIZE_WORKERS", "STABILIZE_IN_FLIGHT"}
+
+
+def text_layer_params():
+    """
+    Returns the tunables above that affect the extracted layer (part of its cache key).
+    """
+    return {
+        name: value for name, value in globals().items()
+        if name.isupper() and name not in _RUNTIME_ONLY_PARAMS
+    }
+
+
+def _to_gray(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+
+def _scaled_size(size, scale):
+    w, h = size
+    return max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+
+
+def probe_video(path):
+    """
+    Returns (frame count, (w, h)) as OpenCV decodes the video (count may be 0 if unknown).
+    """
+    frame_index = load_frame_index(path)
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {path}")
+    total = frame_index["frame_count"] if frame_index else int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+    ok, f = cap.read()
+    cap.release()
+    if not ok:
+        raise RuntimeError(f"Cannot decode video: {path}")
+    h, w = f.shape[:2]
+    return total, (w, h)
+
+
+def _iter_opencv_samples(path, start, stride, max_frames, size, gray):
     cap = cv2.VideoCapture(path)
     if not cap.isOpened():
         raise RuntimeError(f"Cannot open video: {path}")
 
-    frames = []
-    idx = 0
-    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
-    # pick up to max_frames, spacing by stride, but also limited by actual length
-    while True:
-        grabbed = cap.grab()
-        if not grabbed:
-            break
-        if idx % stride == 0:
-            ok, f = cap.retrieve()
+    # on a mezzanine a seek decodes at most one GOP, so it pays off for shorter gaps
+    frame_index = load_frame_index(path)
+    seek_min_gap = min(SEEK_MIN_GAP, frame_index["gop"]) if frame_index else SEEK_MIN_GAP
+
+    pos = 0                                     # index of the frame the decoder returns next
+    target = start
+    try:
+        for _ in range(max_frames):
+            # long gaps: seek (decoder restarts from the preceding keyframe); short gaps: decode forward
+            if target - pos > seek_min_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                pos = target
+            while pos < target:
+                if not cap.grab():
+                    return
+                pos += 1
+            ok, f = cap.read()
             if not ok:
-                break
-            frames.append(f)
-            if len(frames) >= max_frames:
-                break
-        idx += 1
-    cap.release()
+                return
+            pos += 1
+
+            if gray:
+                f = _to_gray(f)
+            if size is not None and (f.shape[1], f.shape[0]) != size:
+                f = cv2.resize(f, size, interpolation=cv2.INTER_AREA)
+            yield f
+            target += stride
+    finally:
+        cap.release()
+
+
+def _iter_ffmpeg_samples(path, start, stride, max_frames, size, gray):
+    w, h = size
+    channels = 1 if gray else 3
+    cmd = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-i", str(path),
+        "-an", "-sn",
+        "-vf", f"select='gte(n\\,{start})*not(mod(n-{start}\\,{stride}))',scale={w}:{h}:flags=area",
+        "-vsync", "0",
+        "-frames:v", str(max_frames),
+        "-pix_fmt", "gray" if gray else "bgr24",
+        "-f", "rawvideo", "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    frame_bytes = w * h * channels
+    try:
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                return
+            f = np.frombuffer(buf, np.uint8).reshape((h, w) if gray else (h, w, 3))
+            yield f
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def _round_order(rounds):
+    """
+    Round offsets in radical-inverse order (0, 2, 1, 3 for 4 rounds), so every prefix of rounds is spread out.
+    """
+    def radical_inverse(i):
+        inv, f = 0.0, 0.5
+        while i:
+            inv += f * (i & 1)
+            i >>= 1
+            f /= 2
+        return inv
+    return sorted(range(rounds), key=radical_inverse)
+
+
+def sample_runs(total, max_frames=SAMPLE_MAX_FRAMES, stride=SAMPLE_STRIDE, rounds=1):
+    """
+    Plans the sample positions as (start, stride, count) runs.
+
+    Sample k sits at frame k * stride (k < max_frames). With rounds > 1, samples are interleaved:
+    round o takes every rounds-th sample starting at k = o, so each round spans the whole range.
+    """
+    if SAMPLE_SPREAD and total > 0:
+        stride = max(stride, -(-total // max_frames))   # ceil: the samples reach the end of the video
+    if total > 0:
+        max_frames = min(max_frames, (total - 1) // stride + 1)
+
+    runs = []
+    for o in _round_order(rounds):
+        count = (max_frames - o + rounds - 1) // rounds
+        if count > 0:
+            runs.append((o * stride, rounds * stride, count))
+    return runs
+
+
+class SampledFrames(FrameConsumer):
+    """
+    Ingest consumer that keeps the frames step 0 samples (main passes and library probe), so
+    its passes read them back instead of decoding the video again.
+
+    The frames are spilled to a .npy memmap (full-res samples would not fit comfortably in memory).
+    """
+
+    def __init__(self, total, size, spill_path):
+        self.total = total
+        self.size = size
+        self.spill_path = Path(spill_path)
+        self._slots = {n: i for i, n in enumerate(self.positions(total))}
+        self._received = set()
+        self._frames = None
+
+    @staticmethod
+    def positions(total):
+        """Frame numbers any step-0 pass may sample, ascending"""
+        positions = set()
+        for max_frames in (SAMPLE_MAX_FRAMES, LIBRARY_PROBE_FRAMES):
+            for start, step, count in sample_runs(total, max_frames, SAMPLE_STRIDE):
+                positions.update(range(start, start + step * count, step))
+        return sorted(positions)
+
+    @classmethod
+    def spill_bytes(cls, total, size):
+        """Disk space the spill of a video with total frames of (w, h) BGR takes"""
+        w, h = size
+        return len(cls.positions(total)) * w * h * 3
+
+    def last_frame(self):
+        return max(self._slots, default=-1)
+
+    def wants(self, frame_num):
+        return frame_num in self._slots
+
+    def consume(self, frame_num, frame):
+        if self._frames is None:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self._frames = np.lib.format.open_memmap(
+                self.spill_path, mode="w+", dtype=np.uint8, shape=(len(self._slots),) + frame.shape
+            )
+        self._frames[self._slots[frame_num]] = frame
+        self._received.add(frame_num)
+
+    def close(self):
+        if self._frames is not None:
+            self._frames.flush()
+
+    def __getstate__(self):
+        # Pickled for a worker process: it reopens the spill file instead of receiving the frames
+        state = self.__dict__.copy()
+        state["_frames"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._received:
+            self._frames = np.load(self.spill_path, mmap_mode="r")
+
+    def iter_samples(self, max_frames, stride, scale, gray, rounds):
+        """Same frames, in the same order, as iter_sampled_frames would decode"""
+        size = _scaled_size(self.size, scale) if scale != 1.0 else None
+        for start, step, count in sample_runs(self.total, max_frames, stride, rounds):
+            for n in range(start, start + step * count, step):
+                if n not in self._slots:
+                    raise RuntimeError(f"Frame {n} was not collected by the ingest")
+                if n not in self._received:
+                    break                       # video ended earlier than its frame count said
+                f = self._frames[self._slots[n]]
+                if gray:
+                    f = _to_gray(f)
+                if size is not None:
+                    f = cv2.resize(f, size, interpolation=cv2.INTER_AREA)
+                else:
+                    f = np.array(f)             # detach from the memmap
+                yield f
+
+    def release(self):
+        """Drops the spilled frames"""
+        self._frames = None
+        self.spill_path.unlink(missing_ok=True)
+
+
+def text_layer_sampler(
+    input_video_path: str,
+    spill_dir: Path,
+    cache_manager: Optional[CacheManager] = None,
+    max_spill_mb: Optional[float] = None,
+) -> Optional[SampledFrames]:
+    """
+    Sample collector for a shared ingest, so step 0 does not decode the video itself.
+
+    Args:
+        input_video_path: Path to the input video
+        spill_dir: Directory for the spilled samples
+        cache_manager: Optional cache manager for caching results
+        max_spill_mb: Disk budget of the spill; above it step 0 decodes the video itself
+
+    Returns:
+        SampledFrames to add to the ingest, or None if the text layer is cached or the
+        samples exceed max_spill_mb
+    """
+    if cache_manager and cache_manager.load("text_layer", input_video_path, params=text_layer_params(), by_content=True):
+        return None
+    total, size = probe_video(input_video_path)
+    spill_mb = SampledFrames.spill_bytes(total, size) / (1024 * 1024)
+    if max_spill_mb is not None and spill_mb > max_spill_mb:
+        logger.info(f"Text-layer samples need {spill_mb:.0f} MB > {max_spill_mb} MB of spill, step 0 will decode the video")
+        return None
+    return SampledFrames(total, size, Path(spill_dir) / "text_layer_samples.npy")
+
+
+def iter_sampled_frames(
+    path,
+    max_frames=SAMPLE_MAX_FRAMES,
+    stride=SAMPLE_STRIDE,
+    scale=1.0,
+    gray=False,
+    decoder=None,
+    rounds=None,
+    samples=None,
+):
+    """
+    Lazily yields up to max_frames frames, taking every stride-th frame of the video.
+
+    With SAMPLE_SPREAD the stride is widened so the samples span the whole duration. The order
+    depends only on the frame count and rounds, so repeated passes see the same frames in the
+    same order; a pass can be cut short by zipping it against an earlier, shorter pass.
+
+    Args:
+        path: Path to the video
+        max_frames: Maximum number of samples
+        stride: (Minimum) distance between samples in frames
+        scale: Resize factor applied by the decoder side
+        gray: Yield single-channel frames
+        decoder: "opencv" or "ffmpeg" (defaults to SAMPLE_DECODER)
+        rounds: Interleaved rounds (defaults to CONVERGE_ROUNDS with early stopping, else 1)
+        samples: SampledFrames collected by a shared ingest, read instead of decoding the video
+    """
+    if rounds is None:
+        rounds = CONVERGE_ROUNDS if CONVERGE_EARLY_STOP else 1
+    if samples is not None:
+        yield from samples.iter_samples(max_frames, stride, scale, gray, rounds)
+        return
+
+    total, full_size = probe_video(path)
+    size = _scaled_size(full_size, scale) if scale != 1.0 else None
+
+    for start, step, count in sample_runs(total, max_frames, stride, rounds):
+        if (decoder or SAMPLE_DECODER) == "ffmpeg":
+            yield from _iter_ffmpeg_samples(path, start, step, count, size or full_size, gray)
+        else:
+            yield from _iter_opencv_samples(path, start, step, count, size, gray)
+
+
+def read_sampled_frames(path, max_frames=SAMPLE_MAX_FRAMES, stride=SAMPLE_STRIDE, samples=None):
+    frames = list(iter_sampled_frames(path, max_frames, stride, samples=samples))
     if len(frames) < 3:
         raise RuntimeError("Not enough frames sampled; need at least 3 frames for temporal stats.")
     return frames
 
 
-def _estimate_transform(from_gray, to_gray, mode="homography"):
-    # ORB features + RANSAC
-    orb = cv2.ORB_create(2000)
-    k1, d1 = orb.detectAndCompute(from_gray, None)
-    k2, d2 = orb.detectAndCompute(to_gray, None)
-    if d1 is None or d2 is None or len(k1) < 8 or len(k2) < 8:
-        return None
+def _pyramid_level(gray, max_dim=STABILIZE_MAX_DIM):
+    """
+    Halves the image until its longest side fits max_dim. Returns (level image, scale to full res).
+    """
+    scale = 1.0
+    while max(gray.shape[:2]) > max_dim:
+        gray = cv2.pyrDown(gray)
+        scale *= 2.0
+    return gray, scale
 
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
-    matches = bf.knnMatch(d1, d2, k=2)
-    good = []
-    for m,n in matches:
-        if m.distance < 0.75 * n.distance:
-            good.append(m)
-    if len(good) < 8:
-        return None
 
-    src = np.float32([k1[m.queryIdx].pt for m in good]).reshape(-1,1,2)
-    dst = np.float32([k2[m.trainIdx].pt for m in good]).reshape(-1,1,2)
+def _warp_frame(frame, tr, size):
+    if tr is None:
+        return frame
+    tmode, T = tr
+    if tmode == "homography":
+        return cv2.warpPerspective(frame, T, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return cv2.warpAffine(frame, T, size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
 
-    if mode == "homography":
-        H, mask = cv2.findHomography(dst, src, cv2.RANSAC, 3.0)  # map 'to' -> 'from'
-        return ("homography", H) if H is not None else None
-    else:
-        A, mask = cv2.estimateAffinePartial2D(dst, src, method=cv2.RANSAC, ransacReprojThreshold=3.0)
-        if A is None:
+
+class FrameStabilizer:
+    """
+    Aligns frames to a fixed reference frame.
+
+    Reference ORB features are computed once, on a downscaled pyramid level; every
+    frame is matched at the same level and the transform is lifted back to full resolution.
+    Holds only numpy state so it can be rebuilt cheaply inside worker processes.
+    """
+
+    def __init__(self, ref_pts, ref_desc, scale, size, mode="homography", feature_mask=None):
+        self.ref_pts = ref_pts
+        self.ref_desc = ref_desc
+        self.scale = scale
+        self.size = size                        # full-res (w, h)
+        self.mode = mode
+        self.feature_mask = feature_mask        # pyramid-level mask of where features may be detected
+        self.orb = cv2.ORB_create(ORB_FEATURES)
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+
+    @classmethod
+    def from_reference(cls, ref_frame, mode="homography", feature_mask=None):
+        """
+        feature_mask: optional full-res uint8 mask (0 = ignore), e.g. to keep static overlays
+        from pulling the transform towards identity
+        """
+        h, w = ref_frame.shape[:2]
+        small, scale = _pyramid_level(_to_gray(ref_frame))
+        if feature_mask is not None:
+            feature_mask = cv2.resize(feature_mask, small.shape[1::-1], interpolation=cv2.INTER_NEAREST)
+        orb = cv2.ORB_create(ORB_FEATURES)
+        k, d = orb.detectAndCompute(small, feature_mask)
+        pts = np.float32([kp.pt for kp in k]).reshape(-1, 2)
+        return cls(pts, d, scale, (w, h), mode, feature_mask)
+
+    def init_args(self):
+        return self.ref_pts, self.ref_desc, self.scale, self.size, self.mode, self.feature_mask
+
+    def estimate(self, frame):
+        """
+        Returns the (mode, matrix) mapping frame -> reference at full resolution, or None.
+        """
+        if self.ref_desc is None or len(self.ref_pts) < 8:
             return None
-        return ("affine", A.astype(np.float32))
 
+        small, _ = _pyramid_level(_to_gray(frame))
+        k, d = self.orb.detectAndCompute(small, self.feature_mask)
+        if d is None or len(k) < 8:
+            return None
 
-def stabilize_frames(frames):
-    h, w = frames[0].shape[:2]
-    ref_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-    stabilized = [frames[0]]
-    for i in range(1, len(frames)):
-        g = cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY)
-        tr = _estimate_transform(ref_gray, g, "homography")
-        if tr is None:
-            # fallback: no transform
-            stabilized.append(frames[i])
-            continue
-        tmode, T = tr
-        if tmode == "homography":
-            warped = cv2.warpPerspective(frames[i], T, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        # ORB features + RANSAC
+        matches = self.matcher.knnMatch(self.ref_desc, d, k=2)
+        good = [p[0] for p in matches if len(p) == 2 and p[0].distance < 0.75 * p[1].distance]
+        if len(good) < 8:
+            return None
+
+        src = self.ref_pts[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+        dst = np.float32([k[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+
+        # lift level coordinates back to full resolution: T_full = S * T_level * S^-1
+        s = self.scale
+        if self.mode == "homography":
+            H, mask = cv2.findHomography(dst, src, cv2.RANSAC, 3.0)  # map 'to' -> 'from'
+            if H is None:
+                return None
+            S = np.diag([s, s, 1.0])
+            S_inv = np.diag([1.0 / s, 1.0 / s, 1.0])
+            return "homography", S @ H @ S_inv
         else:
-            warped = cv2.warpAffine(frames[i], T, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
-        stabilized.append(warped)
-    return stabilized
+            A, mask = cv2.estimateAffinePartial2D(dst, src, method=cv2.RANSAC, ransacReprojThreshold=3.0)
+            if A is None:
+                return None
+            A[:, 2] *= s
+            return "affine", A.astype(np.float32)
 
+    def stabilize(self, frame):
+        tr = self.estimate(frame)               # None -> fallback: no transform
+        return _warp_frame(frame, tr, self.size), tr
 
-def sobel_mag_u8(gray):
+
+_worker_stabilizer = None
+
+
+def _init_stabilizer_worker(*args):
+    global _worker_stabilizer
+    cv2.setNumThreads(1)                        # parallelism comes from the pool
+    _worker_stabilizer = FrameStabilizer(*args)
+
+
+def _stabilize_in_worker(frame):
+    return _worker_stabilizer.stabilize(frame)
+
+
+def _ordered_bounded_map(executor, fn, items, max_in_flight):
+    """
+    Like executor.map, but pulls from items lazily and keeps at most max_in_flight tasks queued.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_stabilized_frames(frames, transforms=None, workers=STABILIZE_WORKERS):
+    """
+    Lazily aligns a stream of frames to the first one, fanning estimate + warp out over a process pool.
+
+    Args:
+        frames: Iterable of BGR frames
+        transforms: Optional list; the transform used for each frame (None = identity) is appended to it
+        workers: Number of worker processes (1 -> serial, in-process)
+    """
+    frames = iter(frames)
+    ref = next(frames, None)
+    if ref is None:
+        return
+
+    if transforms is not None:
+        transforms.append(None)
+    yield ref
+
+    stabilizer = FrameStabilizer.from_reference(ref)
+    if workers <= 1:
+        results = map(stabilizer.stabilize, frames)
+        for warped, tr in results:
+            if transforms is not None:
+                transforms.append(tr)
+            yield warped
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_stabilizer_worker,
+        initargs=stabilizer.init_args(),
+    ) as executor:
+        try:
+            results = _ordered_bounded_map(executor, _stabilize_in_worker, frames, workers * STABILIZE_IN_FLIGHT)
+            for warped, tr in results:
+                if transforms is not None:
+                    transforms.append(tr)
+                yield warped
+        except GeneratorExit:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+
+def iter_warped_frames(frames, transforms):
+    """
+    Replays transforms recorded by iter_stabilized_frames on a second pass over the same samples.
+    """
+    for f, tr in zip(frames, transforms):
+        h, w = f.shape[:2]
+        yield _warp_frame(f, tr, (w, h))
+
+
+def stabilize_frames(frames):
+    return list(iter_stabilized_frames(frames))
+
+
+def _sobel_mag(gray):
     if GAUSS_BLUR:
         gray = cv2.GaussianBlur(gray, (3,3), 0)
     gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=SOBEL_KSIZE)
     gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=SOBEL_KSIZE)
-    mag = cv2.magnitude(gx, gy)
+    return cv2.magnitude(gx, gy)
+
+
+def _mag_to_u8(mag, peak):
     # scale to 0..255 u8
-    m = np.clip((mag / (mag.max() + 1e-6)) * 255.0, 0, 255).astype(np.uint8)
-    return m
+    return np.clip((mag / (peak + 1e-6)) * 255.0, 0, 255).astype(np.uint8)
+
+
+def sobel_mag_u8(gray):
+    mag = _sobel_mag(gray)
+    return _mag_to_u8(mag, mag.max())
+
+
+class TemporalStats:
+    """
+    Running per-pixel temporal statistics over a stream of frames.
+
+    Keeps edge-presence counts and Welford mean/M2 of the Sobel magnitude and gray
+    intensity, so memory is O(H*W) no matter how many frames are folded in.
+    """
+
+    def __init__(self, shape):
+        h, w = shape[:2]
+        self.count = 0
+        self.edge_count = np.zeros((h, w), np.int32)
+        self.mag_mean = np.zeros((h, w), np.float32)
+        self.mag_m2 = np.zeros((h, w), np.float32)
+        self.gray_mean = np.zeros((h, w), np.float32)
+        self.gray_m2 = np.zeros((h, w), np.float32)
+
+    @staticmethod
+    def _welford(mean, m2, x, n):
+        delta = x - mean
+        mean += delta / n
+        m2 += delta * (x - mean)
+
+    def update(self, frame, mag=None):
+        """
+        Folds one frame in. mag optionally supplies its precomputed u8 Sobel magnitude.
+        """
+        gray = _to_gray(frame)
+        if mag is None:
+            mag = sobel_mag_u8(gray)
+        self.count += 1
+        self.edge_count += mag >= EDGE_TAU
+        self._welford(self.mag_mean, self.mag_m2, mag.astype(np.float32), self.count)
+        self._welford(self.gray_mean, self.gray_m2, gray.astype(np.float32), self.count)
+
+    def edge_frequency(self):
+        return self.edge_count.astype(np.float32) / max(self.count, 1)
+
+    def mag_variance(self):
+        return self.mag_m2 / max(self.count, 1)
+
+    def gray_std(self):
+        return np.sqrt(self.gray_m2 / max(self.count, 1))
+
+
+def persistent_edges_from_stats(Q, var_g):
+    """
+    Args:
+      - Q (H,W) edge presence frequency [0..1]
+      - var_g (H,W) temporal variance of the Sobel magnitude
+    Returns:
+      - E_persist (uint8 mask 0/255): pixels that are persistent edges
+    """
+    # normalize variance to 0..1 for combination
+    var_norm = (var_g - var_g.min()) / (var_g.max() - var_g.min() + 1e-6)
+    stability = Q * (1.0 - var_norm)          # high when frequent AND stable
+
+    E = (Q >= PERSIST_QUANTILE) & (stability >= SCORE_MIN)
+    E = (E.astype(np.uint8) * 255)
+
+    # Clean up thin noise
+    if OPEN_ITERS > 0:
+        E = cv2.morphologyEx(E, cv2.MORPH_OPEN, np.ones((3,3), np.uint8), iterations=OPEN_ITERS)
+    if CLOSE_ITERS > 0:
+        E = cv2.morphologyEx(E, cv2.MORPH_CLOSE, np.ones((3,3), np.uint8), iterations=CLOSE_ITERS)
+
+    return E
+
+
+def static_from_std(std):
+    """
+    Returns a mask of pixels whose temporal intensity std is <= GRAY_STD_THR.
+    """
+    M_static = (std <= GRAY_STD_THR).astype(np.uint8) * 255
+    # Smooth small gaps
+    M_static = cv2.morphologyEx(M_static, cv2.MORPH_CLOSE, np.ones((3,3), np.uint8), iterations=1)
+    return M_static
 
 
 def build_persistent_edges(frames):
@@ -139,18 +674,7 @@ def build_persistent_edges(frames):
 
     # Stability: low variance of magnitude
     var_g = mag_stack.astype(np.float32).var(axis=0)  # variance over time
-    # normalize variance to 0..1 for combination
-    var_norm = (var_g - var_g.min()) / (var_g.max() - var_g.min() + 1e-6)
-    stability = Q * (1.0 - var_norm)          # high when frequent AND stable
-
-    E = (Q >= PERSIST_QUANTILE) & (stability >= SCORE_MIN)
-    E = (E.astype(np.uint8) * 255)
-
-    # Clean up thin noise
-    if OPEN_ITERS > 0:
-        E = cv2.morphologyEx(E, cv2.MORPH_OPEN, np.ones((3,3), np.uint8), iterations=OPEN_ITERS)
-    if CLOSE_ITERS > 0:
-        E = cv2.morphologyEx(E, cv2.MORPH_CLOSE, np.ones((3,3), np.uint8), iterations=CLOSE_ITERS)
+    E = persistent_edges_from_stats(Q, var_g)
 
     return E, gray_stack, mag_stack
 
@@ -160,10 +684,7 @@ def low_variance_static(gray_stack):
     Returns a mask of pixels whose intensity is temporally stable (std <= GRAY_STD_THR).
     """
     std = gray_stack.astype(np.float32).std(axis=0)
-    M_static = (std <= GRAY_STD_THR).astype(np.uint8) * 255
-    # Smooth small gaps
-    M_static = cv2.morphologyEx(M_static, cv2.MORPH_CLOSE, np.ones((3,3), np.uint8), iterations=1)
-    return M_static
+    return static_from_std(std)
 
 
 def keep_components_touching_seeds(
@@ -186,46 +707,461 @@ def keep_components_touching_seeds(
     return gate
 
 
-def save_colored_overlay(frames, mask, out_path):
-    stack = np.stack(frames, axis=0).astype(np.uint8)   # (T,H,W,3) BGR
+class PixelHistogram:
+    """
+    Per-pixel 256-bin histograms of u8 values, fed one frame at a time.
+
+    The temporal median is read off the cumulative counts, so neither a (T, N) stack nor a sort is needed.
+    """
+
+    MEDIAN_CHUNK = 65536                        # rows per cumsum chunk in median()
+
+    def __init__(self, n_pixels, channels=3, max_samples=SAMPLE_MAX_FRAMES):
+        self.n_pixels = n_pixels
+        self.channels = channels
+        self.count = 0
+        self.counts = np.zeros((n_pixels * channels, 256), self._dtype(max_samples))
+        self._offsets = np.arange(n_pixels * channels, dtype=np.int64) * 256
+
+    @staticmethod
+    def _dtype(max_samples):
+        return np.uint16 if max_samples <= np.iinfo(np.uint16).max else np.uint32
+
+    @classmethod
+    def nbytes_for(cls, n_pixels, channels=3, max_samples=SAMPLE_MAX_FRAMES):
+        return n_pixels * channels * 256 * np.dtype(cls._dtype(max_samples)).itemsize
+
+    def update(self, pixels):
+        """
+        Args:
+            pixels: (n_pixels, channels) u8 values of one frame
+        """
+        # each (pixel, channel) row gets exactly one hit, so the indices are unique
+        self.counts.reshape(-1)[self._offsets + pixels.reshape(-1)] += 1
+        self.count += 1
+
+    def median(self, rows=None):
+        """
+        Returns the (n, channels) u8 temporal median, matching np.median(...).astype(np.uint8).
+
+        Args:
+            rows: Optional boolean/int selector of the pixels to evaluate
+        """
+        counts = self.counts.reshape(self.n_pixels, self.channels, 256)
+        if rows is not None:
+            counts = counts[rows]
+        counts = counts.reshape(-1, 256)
+
+        # for even counts np.median averages the two middle values
+        k_lo = (self.count - 1) // 2 + 1
+        k_hi = self.count // 2 + 1
+        out = np.empty(len(counts), np.uint8)
+        for i in range(0, len(counts), self.MEDIAN_CHUNK):
+            cum = np.cumsum(counts[i:i + self.MEDIAN_CHUNK], axis=1, dtype=np.int32)
+            lo = (cum >= k_lo).argmax(axis=1)
+            hi = (cum >= k_hi).argmax(axis=1)
+            out[i:i + self.MEDIAN_CHUNK] = (lo + hi) // 2
+        return out.reshape(-1, self.channels)
+
+
+def write_overlay(colors, mask, out_path):
+    """
+    Writes the BGRA text layer: colours where mask is set, alpha from the mask.
+    """
     H, W = mask.shape
     rgba = np.zeros((H, W, 4), np.uint8)
-
-    # where we actually have text
     text_idx = mask > 0
-
-    # compute median ONLY over text pixels, per channel
-    for c in range(3):  # B,G,R
-        ch = stack[:, :, :, c]          # (T,H,W)
-        vals = ch[:, text_idx]          # (T, Ntext)
-        med = np.median(vals, axis=0).astype(np.uint8)   # (Ntext,)
-        tmp = np.zeros((H, W), np.uint8)
-        tmp[text_idx] = med
-        rgba[:, :, c] = tmp
+    rgba[text_idx, :3] = colors[text_idx]
 
     # alpha from mask
-    rgba[:, :, 3] = (mask > 0).astype(np.uint8) * 255
+    rgba[:, :, 3] = text_idx.astype(np.uint8) * 255
 
     ok = cv2.imwrite(out_path, rgba)
     if not ok:
         raise RuntimeError(f"Failed to save {out_path}")
 
 
-def extract_text_layer(
-    work_dir: Path,
-    input_video_path: str,
-):
+def save_colored_overlay(frames, mask, out_path):
+    H, W = mask.shape
+
+    # where we actually have text
+    text_idx = mask > 0
+
+    # per-channel median over time, fed frame by frame and ONLY for text pixels
+    hist = PixelHistogram(int(text_idx.sum()))
+    for f in frames:
+        hist.update(f[text_idx])
+
+    colors = np.zeros((H, W, 3), np.uint8)
+    colors[text_idx] = hist.median()
+    write_overlay(colors, mask, out_path)
+
+
+def running_text_mask(stats):
     """
-    Extracts the text layer from a video file and saves the processed results in a specified
-    working directory.
+    Text mask of the statistics folded so far (same rules as the final mask).
+    """
+    E_persist = persistent_edges_from_stats(stats.edge_frequency(), stats.mag_variance())
+    return keep_components_touching_seeds(static_from_std(stats.gray_std()), E_persist)
+
+
+def _mask_iou(a, b):
+    a = a > 0
+    b = b > 0
+    union = np.count_nonzero(a | b)
+    if union == 0:
+        return 1.0
+    return np.count_nonzero(a & b) / union
+
+
+class MaskConvergence:
+    """
+    Early-stop rule of the sampling passes.
+
+    With CONVERGE_EARLY_STOP, the running text mask is compared every CONVERGE_CHECK_EVERY
+    samples; sampling may stop (after at least SAMPLE_MIN_FRAMES) once CONVERGE_PATIENCE
+    successive comparisons reach CONVERGE_IOU.
+    """
+
+    def __init__(self):
+        self.prev_mask = None
+        self.streak = 0
+
+    def converged(self, count, running_mask):
+        """
+        Args:
+            count: Samples folded so far
+            running_mask: Callable returning the current running text mask (only called on checks)
+        """
+        if not CONVERGE_EARLY_STOP or count % CONVERGE_CHECK_EVERY:
+            return False
+        mask = running_mask()
+        similar = self.prev_mask is not None and _mask_iou(mask, self.prev_mask) >= CONVERGE_IOU
+        self.streak = self.streak + 1 if similar else 0
+        self.prev_mask = mask
+        if self.streak >= CONVERGE_PATIENCE and count >= SAMPLE_MIN_FRAMES:
+            logger.info(f"Text mask converged after {count} samples")
+            return True
+        return False
+
+
+def accumulate_temporal_stats(input_video_path, transforms, scale=1.0, samples=None):
+    """
+    Streams sampled, stabilized frames into a TemporalStats accumulator.
+
+    Sampling stops early under the MaskConvergence rule; transforms then holds only the
+    consumed samples.
 
     Args:
-        work_dir: Path to the directory where the output files will be saved
-        input_video_path: Optional path to input video for cache key generation
+        input_video_path: Path to the input video
+        transforms: List that receives the stabilization transform of every sample
+        scale: Decode-side resize factor of the samples (proxy pass)
+        samples: Optional SampledFrames of a shared ingest
+
+    Returns:
+        TemporalStats folded over all samples
+    """
+    stats = None
+    convergence = MaskConvergence()
+
+    # the statistics only need intensity, so ask the decoder for gray samples
+    sampled = iter_sampled_frames(input_video_path, scale=scale, gray=True, samples=samples)
+    frames = iter_stabilized_frames(sampled, transforms)
+    try:
+        for f in frames:
+            if stats is None:
+                stats = TemporalStats(f.shape)
+            stats.update(f)
+            if convergence.converged(stats.count, lambda: running_text_mask(stats)):
+                break
+    finally:
+        frames.close()
+
+    if stats is None or stats.count < 3:
+        raise RuntimeError("Not enough frames sampled; need at least 3 frames for temporal stats.")
+    return stats
+
+
+def find_text_rois(stats, scale, frame_size):
+    """
+    Finds candidate text boxes on proxy statistics.
+
+    The candidates are the proxy's persistent-edge pixels alone: a proxy pixel averages a thin
+    static stroke with whatever moves next to it, so the static gate (and the opening step)
+    would drop real text. The boxes err on the side of including too much.
+
+    Args:
+        stats: TemporalStats of the proxy pass
+        scale: Proxy scale relative to full resolution
+        frame_size: Full-res (w, h)
+
+    Returns:
+        List of non-overlapping full-res boxes (x0, y0, x1, y1)
     """
-    os.makedirs(work_dir, exist_ok=True)
+    W, H = frame_size
+    cand = (stats.edge_frequency() >= PERSIST_QUANTILE).astype(np.uint8) * 255
+
+    n, _, cc_stats, _ = cv2.connectedComponentsWithStats(cand, connectivity=8)
+    boxes = []
+    for i in range(1, n):
+        x, y, w, h, area = cc_stats[i]
+        if area * (1.0 / scale) ** 2 < MIN_COMPONENT_AREA:
+            continue
+        boxes.append([
+            max(0, int(x / scale) - ROI_PAD),
+            max(0, int(y / scale) - ROI_PAD),
+            min(W, int(np.ceil((x + w) / scale)) + ROI_PAD),
+            min(H, int(np.ceil((y + h) / scale)) + ROI_PAD),
+        ])
+
+    # merge overlapping boxes until stable
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+
+    return [tuple(b) for b in boxes]
+
+
+def _warp_roi(frame, tr, box):
+    """
+    Warps only the box of the stabilized frame (same pixels as cropping a full warp).
+    """
+    x0, y0, x1, y1 = box
+    if tr is None:
+        return frame[y0:y1, x0:x1]
+    tmode, T = tr
+    shift = np.array([[1.0, 0.0, -x0], [0.0, 1.0, -y0], [0.0, 0.0, 1.0]])
+    if tmode == "homography":
+        return _warp_frame(frame, ("homography", shift @ T), (x1 - x0, y1 - y0))
+    A = (shift @ np.vstack([T, [0.0, 0.0, 1.0]]))[:2].astype(np.float32)
+    return _warp_frame(frame, ("affine", A), (x1 - x0, y1 - y0))
+
+
+def _roi_sample(frame, tr, rois, color):
+    """
+    One sample of the ROI pass: the gray frame is warped and its Sobel magnitude normalized
+    exactly as in the full-frame pass, then cropped to the ROIs.
+
+    Returns:
+        (tr, crops, colors): (gray, u8 magnitude) per ROI, and with color the warped BGR
+        pixels per ROI (None otherwise)
+    """
+    gray = _to_gray(frame)
+    h, w = gray.shape
+    warped = _warp_frame(gray, tr, (w, h))
+    mag = sobel_mag_u8(warped)
+    crops = [(warped[y0:y1, x0:x1], mag[y0:y1, x0:x1]) for x0, y0, x1, y1 in rois]
+    colors = [_warp_roi(frame, tr, box).reshape(-1, 3) for box in rois] if color else None
+    return tr, crops, colors
+
+
+_worker_roi_job = None
+
+
+def _init_roi_worker(rois, color, *stabilizer_args):
+    global _worker_roi_job
+    _init_stabilizer_worker(*stabilizer_args)
+    _worker_roi_job = (rois, color)
+
+
+def _roi_sample_in_worker(frame):
+    return _roi_sample(frame, _worker_stabilizer.estimate(frame), *_worker_roi_job)
+
+
+def iter_roi_samples(frames, rois, color=False, workers=STABILIZE_WORKERS):
+    """
+    Like iter_stabilized_frames, but the workers also compute the Sobel magnitudes and ship back
+    only the ROI crops (see _roi_sample), so the full frames never return to this process.
+
+    Args:
+        frames: Iterable of frames (BGR when color is set)
+        rois: Full-res boxes (x0, y0, x1, y1)
+        color: Also return the warped BGR pixels of every ROI
+        workers: Number of worker processes (1 -> serial, in-process)
+    """
+    frames = iter(frames)
+    ref = next(frames, None)
+    if ref is None:
+        return
+
+    yield _roi_sample(ref, None, rois, color)
+
+    stabilizer = FrameStabilizer.from_reference(ref)
+    if workers <= 1:
+        for f in frames:
+            yield _roi_sample(f, stabilizer.estimate(f), rois, color)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_roi_worker,
+        initargs=(rois, color, *stabilizer.init_args()),
+    ) as executor:
+        try:
+            yield from _ordered_bounded_map(
+                executor, _roi_sample_in_worker, frames, workers * STABILIZE_IN_FLIGHT
+            )
+        except GeneratorExit:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+
+def accumulate_roi_stats(input_video_path, rois, transforms, shape, color_hists=None, samples=None):
+    """
+    Full-resolution pass that folds only the ROI pixels of every stabilized sample.
+
+    Transforms, warps and Sobel magnitudes are computed exactly as in the full-frame pass
+    (in the STABILIZE_WORKERS pool), and sampling stops under the same MaskConvergence rule,
+    evaluated on the assembled ROI statistics. With a single full-frame ROI the result is
+    identical to accumulate_temporal_stats; with smaller ROIs the only difference is that
+    persistent_edges_from_stats normalizes the magnitude variance over the ROIs.
+
+    Args:
+        input_video_path: Path to the input video
+        rois: Full-res boxes (x0, y0, x1, y1)
+        transforms: List that receives the stabilization transform of every sample
+        shape: Full-res (H, W)
+        color_hists: Optional PixelHistogram per ROI, fed with the same warped pixels for the overlay colour
+        samples: Optional SampledFrames of a shared ingest
+
+    Returns:
+        One TemporalStats per ROI
+    """
+    roi_stats = [TemporalStats((y1 - y0, x1 - x0)) for x0, y0, x1, y1 in rois]
+    convergence = MaskConvergence()
+    color = color_hists is not None
+
+    def running_mask():
+        Q, var_g, std = assemble_roi_stats(roi_stats, rois, shape)
+        return keep_components_touching_seeds(static_from_std(std), persistent_edges_from_stats(Q, var_g))
+
+    # gray samples are enough (and cheaper to ship to the workers) unless colours are collected
+    sampled = iter_sampled_frames(input_video_path, gray=not color, samples=samples)
+    results = iter_roi_samples(sampled, rois, color)
+    try:
+        for tr, crops, colors in results:
+            transforms.append(tr)
+            for i, (st, (g, mag)) in enumerate(zip(roi_stats, crops)):
+                st.update(g, mag)
+                if color:
+                    color_hists[i].update(colors[i])
+            if convergence.converged(roi_stats[0].count, running_mask):
+                break
+    finally:
+        results.close()
+
+    if roi_stats[0].count < 3:
+        raise RuntimeError("Not enough frames sampled; need at least 3 frames for temporal stats.")
+    return roi_stats
+
+
+def assemble_roi_stats(roi_stats, rois, shape):
+    """
+    Pastes per-ROI statistics into full-frame (Q, var_g, std) arrays; outside the ROIs nothing is text.
+    """
+    H, W = shape[:2]
+    Q = np.zeros((H, W), np.float32)
+    var_g = np.zeros((H, W), np.float32)
+    std = np.full((H, W), 255.0, np.float32)
+    for st, (x0, y0, x1, y1) in zip(roi_stats, rois):
+        Q[y0:y1, x0:x1] = st.edge_frequency()
+        var_g[y0:y1, x0:x1] = st.mag_variance()
+        std[y0:y1, x0:x1] = st.gray_std()
+    return Q, var_g, std
+
+
+def _detect_in_rois(input_video_path, transforms, samples=None):
+    """
+    Coarse-to-fine detection: proxy pass for candidate boxes, then full-res stats inside them.
+
+    Returns:
+        (E_persist, M_static, rois, color_hists): full-res masks, the ROIs used, and one
+        PixelHistogram per ROI when they fit OVERLAY_HIST_MAX_MB (None otherwise)
+    """
+    proxy_transforms = []
+    proxy_stats = accumulate_temporal_stats(
+        input_video_path, proxy_transforms, scale=ROI_PROXY_SCALE, samples=samples
+    )
+
+    W, H = samples.size if samples is not None else probe_video(input_video_path)[1]
+
+    rois = find_text_rois(proxy_stats, ROI_PROXY_SCALE, (W, H))
+    covered = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois)
+    if not rois or covered > ROI_MAX_AREA_FRAC * W * H:
+        logger.info("ROI candidates cover too little/much of the frame, using a full-frame ROI")
+        rois = [(0, 0, W, H)]
+    else:
+        logger.info(f"Found {len(rois)} candidate text ROI(s) covering {covered / (W * H):.1%} of the frame")
+
+    # collect overlay colours in the same decode when the histograms are affordable
+    sizes = [(x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in rois]
+    color_hists = None
+    if sum(PixelHistogram.nbytes_for(n) for n in sizes) <= OVERLAY_HIST_MAX_MB * 1024 * 1024:
+        color_hists = [PixelHistogram(n) for n in sizes]
+
+    # the proxy pass only locates the ROIs; the full-res pass estimates its own transforms
+    roi_stats = accumulate_roi_stats(input_video_path, rois, transforms, (H, W), color_hists, samples=samples)
+    Q, var_g, std = assemble_roi_stats(roi_stats, rois, (H, W))
+    return persistent_edges_from_stats(Q, var_g), static_from_std(std), rois, color_hists
+
+
+def colors_from_roi_histograms(color_hists, rois, mask):
+    """
+    Temporal median colour of the mask pixels, evaluated from per-ROI histograms.
+    """
+    H, W = mask.shape
+    colors = np.zeros((H, W, 3), np.uint8)
+    for hist, (x0, y0, x1, y1) in zip(color_hists, rois):
+        sub = mask[y0:y1, x0:x1] > 0
+        if sub.any():
+            colors[y0:y1, x0:x1][sub] = hist.median(rows=sub.reshape(-1))
+    return colors
+
+
+def _compute_text_layer(input_video_path, overlay_path, samples=None):
+    """
+    Runs the extraction and writes the overlay. Returns the text mask.
+    """
+    if STREAMING_STATS:
+        logger.info(f"Streaming & stabilizing samples: {input_video_path}")
+        transforms = []
+        color_hists = None
+        if ROI_DETECTION:
+            logger.info("Computing persistent edges and static pixels inside candidate ROIs...")
+            E_persist, M_static, rois, color_hists = _detect_in_rois(input_video_path, transforms, samples)
+        else:
+            stats = accumulate_temporal_stats(input_video_path, transforms, samples=samples)
+
+            logger.info("Computing persistent edges...")
+            E_persist = persistent_edges_from_stats(stats.edge_frequency(), stats.mag_variance())
+
+            logger.info("Selecting static (low-variance) pixels...")
+            M_static = static_from_std(stats.gray_std())
+
+        logger.info("Keeping static components that touch persistent edges...")
+        M_text = keep_components_touching_seeds(M_static, E_persist)
+
+        if color_hists is not None:
+            # colours were collected during the ROI pass
+            write_overlay(colors_from_roi_histograms(color_hists, rois, M_text), M_text, overlay_path)
+        else:
+            # second pass over the same samples, replaying the recorded alignment
+            frames = iter_warped_frames(iter_sampled_frames(input_video_path, samples=samples), transforms)
+            save_colored_overlay(frames, M_text, overlay_path)
+        return M_text
+
     logger.info(f"Reading & sampling: {input_video_path}")
-    frames = read_sampled_frames(input_video_path)
+    frames = read_sampled_frames(input_video_path, samples=samples)
 
     logger.info("Stabilizing frames (global alignment)...")
     frames = stabilize_frames(frames)
@@ -240,6 +1176,76 @@ def extract_text_layer(
     M_text = keep_components_touching_seeds(M_static, E_persist)
 
     # also save a colored overlay with alpha
-    overlay_path = os.path.join(work_dir, "text_rgba.png")
     save_colored_overlay(frames, M_text, overlay_path)
-    logger.info(f"Saved colored overlay -> {overlay_path}")
+    return M_text
+
+
+def extract_text_layer(
+    work_dir: Path,
+    input_video_path: str,
+    cache_manager: Optional[CacheManager] = None,
+    library: Optional[TextLayerLibrary] = None,
+    samples: Optional[SampledFrames] = None,
+) -> Path:
+    """
+    Extracts the text layer from a video file and saves the processed results in a specified
+    working directory.
+
+    Results are cached by video content and text_layer_params(), so reruns (and other themes)
+    of the same source reuse the layer. With a library, a layer already extracted from another
+    video is reused when it verifies against a few frames of this one.
+
+    Args:
+        work_dir: Path to the directory where the output files will be saved
+        input_video_path: Path to the input video
+        cache_manager: Optional cache manager for caching results
+        library: Optional library of known text layers
+        samples: Frames collected by a shared ingest (see text_layer_sampler), read instead of decoding
+
+    Returns:
+        Path to the text layer PNG (the mask is saved next to it as TEXT_MASK_FILE)
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    overlay_path = work_dir / TEXT_LAYER_FILE
+    mask_path = work_dir / TEXT_MASK_FILE
+
+    # Check cache first
+    params = text_layer_params()
+    if cache_manager:
+        cached_data = cache_manager.load("text_layer", input_video_path, params=params, by_content=True)
+        if cached_data:
+            logger.info("Using cached text layer")
+            shutil.copyfile(cached_data["text_layer_path"], overlay_path)
+            shutil.copyfile(cached_data["mask_path"], mask_path)
+            return overlay_path
+
+    match = None
+    if library:
+        probe_frames = list(iter_sampled_frames(
+            input_video_path, max_frames=LIBRARY_PROBE_FRAMES, rounds=1, samples=samples
+        ))
+        match = library.match(probe_frames)
+
+    if match:
+        logger.info(f"Reusing text layer {match['id']} from the library")
+        shutil.copyfile(match["text_layer_path"], overlay_path)
+        shutil.copyfile(match["mask_path"], mask_path)
+    else:
+        M_text = _compute_text_layer(input_video_path, str(overlay_path), samples)
+        logger.info(f"Saved colored overlay -> {overlay_path}")
+
+        if not cv2.imwrite(str(mask_path), M_text):
+            raise RuntimeError(f"Failed to save {mask_path}")
+        if library:
+            library.add(overlay_path, mask_path)
+
+    # Save to cache (the files live next to the cache entry, so other work dirs can reuse them)
+    if cache_manager:
+        artifact_dir = cache_manager.get_artifact_dir("text_layer", input_video_path, params=params, by_content=True)
+        cached_overlay = shutil.copyfile(overlay_path, artifact_dir / TEXT_LAYER_FILE)
+        cached_mask = shutil.copyfile(mask_path, artifact_dir / TEXT_MASK_FILE)
+        cache_data = {"text_layer_path": str(cached_overlay), "mask_path": str(cached_mask)}
+        cache_manager.save("text_layer", input_video_path, cache_data, params=params, by_content=True)
+
+    return overlay_path
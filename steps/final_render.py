@@ -0,0 +1,317 @@
+"""Steps 7-8: Concatenate the generated clips, overlay the text layer and lay in the audio in one encode"""
+
+import asyncio
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import cv2
+
+from steps.reassembly import reassemble_video
+from utils.async_utils import run_process
+from utils.config import Config
+from utils.encoder import encoder_args
+from utils.logger import setup_logger
+from utils.video_probe import probe_video_stream
+
+logger = setup_logger(__name__)
+
+
+def crop_text_layer(text_layer_path: Path) -> Optional[Tuple[Path, Tuple[int, int, int, int], Tuple[int, int]]]:
+    """
+    Crops the text layer to the bounding box of its visible pixels
+
+    Args:
+        text_layer_path: Path to the full-frame BGRA text layer
+
+    Returns:
+        (path to the cropped PNG, (x, y, w, h) box of the crop, (w, h) of the full layer),
+        or None if the layer is missing or empty
+    """
+    layer = cv2.imread(str(text_layer_path), cv2.IMREAD_UNCHANGED)
+    if layer is None or layer.ndim != 3 or layer.shape[2] != 4:
+        return None
+
+    x, y, w, h = cv2.boundingRect((layer[:, :, 3] > 0).astype("uint8"))
+    if w == 0 or h == 0:
+        return None
+
+    crop_path = Path(text_layer_path).with_name(f"{Path(text_layer_path).stem}_crop.png")
+    if not cv2.imwrite(str(crop_path), layer[y:y + h, x:x + w]):
+        raise RuntimeError(f"Failed to save {crop_path}")
+
+    full_h, full_w = layer.shape[:2]
+    return crop_path, (x, y, w, h), (full_w, full_h)
+
+
+def _video_size(video_path: str) -> Tuple[int, int]:
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video file: {video_path}")
+    size = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return size
+
+
+def _overlay_filters(video_label: str, overlay_input: int, crop, width: int, height: int, tag: str = "") -> List[str]:
+    """
+    Filters that scale the cropped layer to the output resolution and overlay it at its offset (-> [out{tag}])
+    """
+    _, (x, y, crop_w, crop_h), (layer_w, layer_h) = crop
+    sx, sy = width / layer_w, height / layer_h
+    # A single image: overlay repeats its last frame until the video ends (no per-frame PNG decode)
+    return [
+        f"[{overlay_input}:v]scale={max(1, round(crop_w * sx))}:{max(1, round(crop_h * sy))}[ovl{tag}]",
+        f"{video_label}[ovl{tag}]overlay={round(x * sx)}:{round(y * sy)}:format=auto[out{tag}]",
+    ]
+
+
+def _output_filters(video_label: str, next_input: int, crop, base_size: Tuple[int, int], outputs: List[tuple]):
+    """
+    Splits the decoded video into one branch per output, scales each branch to its output size
+    and composites the text layer at that native scale (from the full-resolution layer).
+
+    Args:
+        video_label: Filter label of the decoded video, at base_size
+        next_input: Index the first added input gets
+        crop: Result of crop_text_layer (None: no overlay)
+        base_size: (w, h) of the decoded video
+        outputs: (path, width, height, bitrate) per output
+
+    Returns:
+        (filters, extra input args, filter label per output)
+    """
+    filters, inputs, labels = [], [], []
+    branches = [video_label]
+    if len(outputs) > 1:
+        branches = [f"[s{k}]" for k in range(len(outputs))]
+        filters.append(f"{video_label}split={len(outputs)}{''.join(branches)}")
+
+    for k, ((_, width, height, _), label) in enumerate(zip(outputs, branches)):
+        if (width, height) != tuple(base_size):
+            filters.append(f"{label}scale={width}:{height},setsar=1[r{k}]")
+            label = f"[r{k}]"
+        if crop:
+            inputs += ["-i", str(crop[0])]
+            filters += _overlay_filters(label, next_input, crop, width, height, tag=str(k))
+            label = f"[out{k}]"
+            next_input += 1
+        labels.append(label)
+
+    return filters, inputs, labels
+
+
+async def _seam_trims(generated_intervals: List[str], shared_start: Optional[List[bool]]) -> List[str]:
+    """
+    Filter prefix per clip that drops the first frame of a clip starting on the previous clip's
+    last keyframe, so the shared frame is not shown twice at the seam ("" for other clips).
+    generate_video_intervals makes the previous clip one frame longer to make up for it.
+    setpts clears the stream's frame rate (the encoder would fall back to 25 fps), so the
+    clip's rate is restored after it.
+    """
+    async def seam_trim(index: int, video_interval: str) -> str:
+        if not (index > 0 if shared_start is None else shared_start[index]):
+            return ""
+        rate = (await probe_video_stream(video_interval))["rate"]
+        return f"trim=start_frame=1,setpts=PTS-STARTPTS,fps={rate},"
+
+    return list(await asyncio.gather(*(
+        seam_trim(index, video_interval) for index, video_interval in enumerate(generated_intervals)
+    )))
+
+
+def _bitrate_args(bitrate: Optional[str]) -> List[str]:
+    """Caps the bitrate of a rendition (platform limits); None keeps the encoder's quality target"""
+    if not bitrate:
+        return []
+    value = float(bitrate.rstrip("kKmM")) * (1000 if bitrate[-1] in "kK" else 1000000 if bitrate[-1] in "mM" else 1)
+    return ["-maxrate", bitrate, "-bufsize", str(int(2 * value))]
+
+
+def _outputs(output_path: Path, width: int, height: int, config: Config) -> List[tuple]:
+    """
+    The main output (clip resolution) followed by config.renditions, as (path, width, height, bitrate)
+    """
+    outputs = [(output_path, width, height, None)]
+    for name, rendition_w, rendition_h, bitrate in config.renditions:
+        path = output_path.with_name(f"{output_path.stem}_{name}{output_path.suffix}")
+        outputs.append((path, rendition_w, rendition_h, bitrate))
+    return outputs
+
+
+async def _render_chunks(
+    generated_intervals: List[str],
+    crop,
+    width: int,
+    height: int,
+    outputs: List[tuple],
+    chunk_dir: Path,
+    config: Config,
+    trims: List[str],
+    rate: str,
+) -> List[List[Path]]:
+    """
+    Encodes the overlay on every generated clip in parallel ffmpeg processes (silent chunks,
+    one per output). Each process gets an equal share of the CPUs, since one encoder does
+    not scale to many cores. Every chunk is resampled to the same frame rate, so the chunks
+    concatenate without being conformed again.
+
+    Returns:
+        Chunk paths per output
+    """
+    cpus = os.cpu_count() or 1
+    workers = config.render_workers or max(1, cpus // 4)
+    threads = max(1, cpus // workers)
+    semaphore = asyncio.Semaphore(workers)
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+
+    logger.info(f"Encoding {len(generated_intervals)} chunks, {workers} at a time with {threads} thread(s) each")
+
+    async def render_chunk(index: int, video_interval: str) -> List[Path]:
+        chunk_paths = [chunk_dir / f"chunk_{index:03d}_{k}.mp4" for k in range(len(outputs))]
+        filters, inputs, labels = _output_filters(
+            "[v]", 1, crop, (width, height), outputs
+        )
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(video_interval), *inputs]
+        cmd += ["-filter_complex", ";".join([f"[0:v]{trims[index]}scale={width}:{height},setsar=1,fps={rate}[v]", *filters])]
+        for chunk_path, label, (_, _, _, bitrate) in zip(chunk_paths, labels, outputs):
+            cmd += ["-map", label, "-an", *encoder_args(config, threads=threads), *_bitrate_args(bitrate)]
+            cmd += [str(chunk_path)]
+
+        async with semaphore:
+            result = await run_process(cmd)
+        if result.returncode != 0:
+            raise RuntimeError(f"Chunk {index} encode failed: {result.stderr.strip()}")
+        return chunk_paths
+
+    per_chunk = await asyncio.gather(*(
+        render_chunk(index, video_interval) for index, video_interval in enumerate(generated_intervals)
+    ))
+    return [list(paths) for paths in zip(*per_chunk)]
+
+
+async def render_final_video(
+    generated_intervals: List[str],
+    text_layer_path: Optional[Path],
+    output_path: Path,
+    audio_source: Optional[str] = None,
+    audio_start: float = 0.0,
+    config: Optional[Config] = None,
+    shared_start: Optional[List[bool]] = None,
+) -> Path:
+    """
+    Render the final video with a single ffmpeg filter graph: concatenate the generated clips,
+    overlay the text layer (cropped to its bounding box, placed at its offset and scaled to
+    the clips' resolution), stream-copy the original audio and encode once.
+
+    Every entry of config.renditions is produced by the same run (split after the decode, the
+    text layer composited at the rendition's own scale) as <output stem>_<name>.mp4.
+
+    With config.render_chunk_parallel, each clip is overlaid and encoded in its own process
+    instead, and the chunks are concatenated losslessly (with the audio) afterwards. Only that
+    concat needs conforming streams (reassemble_video); the single graph decodes and scales
+    every clip, whatever its codec or size.
+
+    Args:
+        generated_intervals: List of paths to generated intervals from Step. 6 (in order)
+        text_layer_path: Path to the text layer PNG (no overlay if missing or empty)
+        output_path: Path for the final video
+        audio_source: Optional video whose first audio track is laid under the result
+        audio_start: Source time (s) of the first interval, where the audio starts
+        config: Optional configuration (encoder settings, renditions)
+        shared_start: Per clip, whether it starts on the previous clip's last keyframe (its first
+            frame is dropped); defaults to every clip after the first
+
+    Returns:
+        Path to the final video
+    """
+    logger.info(f"Rendering {len(generated_intervals)} intervals into the final video")
+
+    if not generated_intervals:
+        raise ValueError("No generated intervals to render")
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    config = config or Config()
+
+    # The output takes the resolution of the generated clips
+    width, height = await asyncio.to_thread(_video_size, generated_intervals[0])
+    outputs = _outputs(output_path, width, height, config)
+
+    crop = None
+    if text_layer_path and Path(text_layer_path).exists():
+        crop = await asyncio.to_thread(crop_text_layer, text_layer_path)
+    if not crop:
+        logger.warning(f"Text layer not found or empty at {text_layer_path}, skipping overlay")
+
+    trims = await _seam_trims(generated_intervals, shared_start)
+
+    if config.render_chunk_parallel and len(generated_intervals) > 1:
+        chunk_dir = output_path.parent / "render_chunks"
+        # like the resolution, the frame rate is the first clip's
+        rate = (await probe_video_stream(generated_intervals[0]))["rate"]
+        chunks = await _render_chunks(
+            generated_intervals, crop, width, height, outputs, chunk_dir, config, trims, rate
+        )
+        for (path, _, _, _), output_chunks in zip(outputs, chunks):
+            await reassemble_video(
+                output_chunks, path, audio_source=audio_source, audio_start=audio_start, config=config
+            )
+        shutil.rmtree(chunk_dir, ignore_errors=True)
+        return output_path
+
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+    for video_interval in generated_intervals:
+        cmd += ["-i", str(Path(video_interval).absolute())]
+
+    filters = [
+        f"[{i}:v]{trims[i]}scale={width}:{height},setsar=1[v{i}]"
+        for i in range(len(generated_intervals))
+    ]
+    filters.append(
+        "".join(f"[v{i}]" for i in range(len(generated_intervals)))
+        + f"concat=n={len(generated_intervals)}:v=1:a=0[cat]"
+    )
+
+    output_filters, overlay_inputs, labels = _output_filters(
+        "[cat]", len(generated_intervals), crop, (width, height), outputs
+    )
+    filters += output_filters
+    cmd += overlay_inputs
+    audio_input = len(generated_intervals) + len(overlay_inputs) // 2
+
+    if audio_source:
+        if audio_start > 0:
+            # Input seek with a stream copy lands on an AAC packet boundary, not on the exact
+            # sample: up to one packet (1024 samples, ~21 ms at 48 kHz) off the offset
+            cmd += ["-ss", f"{audio_start}"]
+        cmd += ["-i", str(audio_source)]
+
+    # Output options go after all inputs
+    cmd += ["-filter_complex", ";".join(filters)]
+    for (path, _, _, bitrate), label in zip(outputs, labels):
+        cmd += ["-map", label]
+        if audio_source:
+            cmd += [
+                "-map", f"{audio_input}:a:0?",  # Sources without audio stay silent
+                "-c:a", "copy",
+                "-shortest",
+            ]
+        cmd += encoder_args(config) + _bitrate_args(bitrate)
+        cmd += [str(path)]
+
+    logger.info(f"Running ffmpeg: {' '.join(cmd)}")
+
+    try:
+        await run_process(cmd, check=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg failed: {e.stderr}")
+        raise
+
+    for path, rendition_w, rendition_h, _ in outputs[1:]:
+        logger.info(f"Rendition {rendition_w}x{rendition_h}: {path}")
+    logger.info(f"Final video created: {output_path}")
+    return output_path
@@ -1,7 +1,7 @@
 """Step 5: Edit cleaned video intervals with reference images"""
 
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from utils.logger import setup_logger
 from utils.config import Config
@@ -9,6 +9,7 @@ from utils.falai_worker import FalAIWorker
 from utils.openai_worker import OpenAIWorker
 from utils.download_file import download_file
 from utils.cache_manager import CacheManager
+from steps.person_detection import load_frame_detections
 from schemas import VideoInterval, Person
 
 logger = setup_logger(__name__)
@@ -97,6 +98,59 @@ async def edit_single_frame(
         raise
 
 
+async def edit_keyframe(
+    frame_path: Path,
+    new_person_registry: List[Person],
+    work_dir: Path,
+    openai_worker: OpenAIWorker,
+    config: Config,
+    frame_people: Optional[List[Person]] = None,
+) -> Path:
+    """
+    Edit the people in a cleaned keyframe into the new people
+
+    Args:
+        frame_path: Path to the cleaned frame
+        new_person_registry: New people registry based on transformation theme
+        work_dir: Working directory for outputs
+        openai_worker: OpenAI worker instance
+        config: Pipeline configuration
+        frame_people: People step 3 detected in this frame (detected again if None)
+
+    Returns:
+        Path to edited frame
+    """
+    # Detect people in the frame
+    if frame_people is None:
+        frame_people = await openai_worker.analyze_frame_for_people(frame_path, config)
+
+    # Get reference images for detected people in the frame (from NEW person registry)
+    reference_images = get_reference_images_for_people(
+        frame_people,
+        new_person_registry,
+        work_dir,
+    )
+
+    # Generate dynamic prompt for the frame using BOTH registries
+    prompt = await generate_transformation_prompt_with_mapping(
+        people_in_frame=frame_people,
+        new_person_registry=new_person_registry,
+        openai_worker=openai_worker,
+        config=config,
+    )
+
+    # Edit the frame with reference images
+    edited_path = work_dir / f"{frame_path.stem}_edited.jpg"
+    await edit_single_frame(
+        frame_path,
+        edited_path,
+        prompt,
+        config,
+        reference_images,
+    )
+    return edited_path
+
+
 async def edit_frames(
     cleaned_video_intervals: List[VideoInterval],
     new_person_registry: List[Person],
@@ -133,87 +187,53 @@ async def edit_frames(
 
     edited_intervals: List[VideoInterval] = []
 
-    for video_interval in cleaned_video_intervals:
-        interval_index = video_interval.index
-        logger.info(f"Editing frames for interval {interval_index}")
-
-        try:
-            # Use the cleaned frames
-            start_frame_path = video_interval.start_frame_path
-            end_frame_path = video_interval.end_frame_path
-
-            # Detect people in the start frame
-            start_frame_people = await openai_worker.analyze_frame_for_people(start_frame_path, config)
-
-            # Get reference images for detected people in the start frame (from NEW person registry)
-            start_reference_images = get_reference_images_for_people(
-                start_frame_people,
-                new_person_registry,
-                work_dir,
-            )
-
-            # Generate dynamic prompt for start frame using BOTH registries
-            start_prompt = await generate_transformation_prompt_with_mapping(
-                people_in_frame=start_frame_people,
-                new_person_registry=new_person_registry,
-                openai_worker=openai_worker,
-                config=config,
-            )
+    # Step 3 already analyzed these frames: reuse its detections (same frame content)
+    frame_detections = load_frame_detections(input_video_path, cache_manager)
+    if frame_detections:
+        logger.info(f"Reusing person detections of {len(frame_detections)} frames from step 3")
 
-            # Edit the start frame with reference images
-            start_edited_path = work_dir / f"interval_{interval_index:03d}_start_edited.jpg"
-            await edit_single_frame(
-                start_frame_path,
-                start_edited_path,
-                start_prompt,
-                config,
-                start_reference_images,
-            )
-
-            # Detect people in the end frame
-            end_frame_people = await openai_worker.analyze_frame_for_people(end_frame_path, config)
+    # Adjacent intervals share their boundary keyframe: edit every frame once
+    edited_paths: Dict[Path, Path] = {}
 
-            # Get reference images for detected people in the end frame
-            end_reference_images = get_reference_images_for_people(
-                end_frame_people,
+    async def edit(frame_path: Path) -> Path:
+        if frame_path not in edited_paths:
+            edited_paths[frame_path] = await edit_keyframe(
+                frame_path,
                 new_person_registry,
                 work_dir,
-            )
-
-            # Generate dynamic prompt for end frame using BOTH registries
-            end_prompt = await generate_transformation_prompt_with_mapping(
-                people_in_frame=end_frame_people,
-                new_person_registry=new_person_registry,
-                openai_worker=openai_worker,
-                config=config,
-            )
-
-            # Edit end frame with reference images
-            end_edited_path = work_dir / f"interval_{interval_index:03d}_end_edited.jpg"
-            await edit_single_frame(
-                end_frame_path,
-                end_edited_path,
-                end_prompt,
+                openai_worker,
                 config,
-                reference_images=end_reference_images,
+                frame_people=frame_detections.get(CacheManager.file_digest(frame_path)),
             )
+        return edited_paths[frame_path]
 
-            edited_intervals.append(VideoInterval(
-                index=interval_index,
-                start_frame_path=start_edited_path,
-                end_frame_path=end_edited_path,
-                start_time=video_interval.start_time,
-                end_time=video_interval.end_time,
-                duration=video_interval.duration,
-                fps=video_interval.fps,
-                audio_path=video_interval.audio_path,
-            ))
-
-            logger.info(f"Edited frames for interval {interval_index}")
+    for video_interval in cleaned_video_intervals:
+        interval_index = video_interval.index
+        logger.info(f"Editing frames for interval {interval_index}")
 
+        # Use the cleaned frames. A missing interval would shift the audio under every later
+        # clip (the render lays one continuous track from the first interval), so fail instead
+        try:
+            start_edited_path = await edit(video_interval.start_frame_path)
+            end_edited_path = await edit(video_interval.end_frame_path)
         except Exception as e:
             logger.error(f"Failed to edit frames for interval {interval_index}: {str(e)}")
-            continue
+            raise
+
+        edited_intervals.append(VideoInterval(
+            index=interval_index,
+            start_frame_path=start_edited_path,
+            end_frame_path=end_edited_path,
+            start_time=video_interval.start_time,
+            end_time=video_interval.end_time,
+            duration=video_interval.duration,
+            fps=video_interval.fps,
+            audio_path=video_interval.audio_path,
+            start_frame=video_interval.start_frame,
+            end_frame=video_interval.end_frame,
+        ))
+
+        logger.info(f"Edited frames for interval {interval_index}")
 
     # Save to cache
     if cache_manager and input_video_path:
@@ -0,0 +1,223 @@
+"""Step 2 (local engine): Remove the text overlay from keyframes with the step-0 mask, CPU only"""
+
+import warnings
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+from steps.extract_text_layer import FrameStabilizer
+from utils.logger import setup_logger
+from utils.video_ingest import FrameConsumer, VideoIngest
+
+logger = setup_logger(__name__)
+
+NEIGHBOUR_OFFSETS = (-32, -16, -8, -4, 4, 8, 16, 32)   # frames around a keyframe that may reveal the background
+MASK_CLOSE = 8                                          # px; closes small gaps in the glyph outlines before filling them
+MASK_DILATE = 3                                         # px grown around the text mask (anti-aliasing, shadows)
+RING_WIDTH = 12                                         # px around the mask used to check an alignment
+RING_MAX_DIFF = 12.0                                    # max median gray difference on the ring for a usable neighbour
+RING_MIN_COVERAGE = 0.5                                 # fraction of the ring the warped neighbour must cover
+INPAINT_RADIUS = 5                                      # cv2.inpaint radius where no neighbour showed the background
+
+
+def removal_mask(mask: np.ndarray) -> np.ndarray:
+    """
+    Pixels to replace: the step-0 mask marks the glyph outlines, so their gaps are closed and
+    the enclosed interiors filled, then the result is grown by MASK_DILATE
+    """
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * MASK_CLOSE + 1, 2 * MASK_CLOSE + 1))
+    closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    # whatever the background flood fill cannot reach is enclosed by an outline
+    h, w = closed.shape
+    outside = np.pad(closed, 1)
+    cv2.floodFill(outside, np.zeros((h + 4, w + 4), np.uint8), (0, 0), 255)
+    filled = closed | ~outside[1:-1, 1:-1]
+
+    if MASK_DILATE:
+        filled = cv2.dilate(filled, np.ones((3, 3), np.uint8), iterations=MASK_DILATE)
+    return filled
+
+
+def _warp_region(image, tr, box, border_value):
+    """Warps image into the keyframe's coordinates, only over the box (x, y, w, h)"""
+    x, y, w, h = box
+    tmode, T = tr
+    shift = np.array([[1, 0, -x], [0, 1, -y], [0, 0, 1]], dtype=np.float64)
+    if tmode == "homography":
+        return cv2.warpPerspective(
+            image, shift @ T, (w, h), flags=cv2.INTER_LINEAR,
+            borderMode=cv2.BORDER_CONSTANT, borderValue=border_value,
+        )
+    A = (shift @ np.vstack([T, [0, 0, 1]]))[:2]
+    return cv2.warpAffine(
+        image, A, (w, h), flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT, borderValue=border_value,
+    )
+
+
+class _Keyframe:
+    """Fill state of one keyframe: its masked pixels and the background candidates seen so far"""
+
+    def __init__(self, frame_num: int, frame_path: Path, output_path: Path):
+        self.frame_num = frame_num
+        self.frame_path = frame_path
+        self.output_path = output_path
+        self.image = None
+        self.stabilizer = None
+        self.candidates: List[np.ndarray] = []      # (P, 3) float32 per usable neighbour, NaN where hidden
+
+
+class BackgroundFill(FrameConsumer):
+    """
+    Ingest consumer that removes the (screen-static) text overlay from keyframes.
+
+    Every neighbouring frame is aligned to the keyframe (features outside the text only), and
+    the masked keyframe pixels whose scene point is not under the text in that neighbour take
+    its colour. The per-pixel median over the neighbours fills the mask; pixels no neighbour
+    revealed are inpainted. Pixels outside the mask are left untouched.
+    """
+
+    def __init__(self, keyframes: Dict[int, Path], outputs: Dict[Path, Path], mask: np.ndarray, total: int):
+        self.mask = removal_mask(mask)
+        ring = cv2.dilate(self.mask, np.ones((3, 3), np.uint8), iterations=RING_WIDTH)
+
+        # all work happens inside the box around the mask and its ring
+        x, y, bw, bh = cv2.boundingRect(ring)
+        self.box = (x, y, bw, bh)
+        self.box_mask = self.mask[y:y + bh, x:x + bw] > 0
+        self.box_ring = (ring[y:y + bh, x:x + bw] > 0) & ~self.box_mask
+        self.feature_mask = np.where(self.mask > 0, 0, 255).astype(np.uint8)
+
+        self.keyframes = {
+            frame_num: _Keyframe(frame_num, frame_path, outputs[frame_path])
+            for frame_num, frame_path in keyframes.items()
+        }
+        self.wanted: Dict[int, List[int]] = {}
+        for frame_num in keyframes:
+            for offset in NEIGHBOUR_OFFSETS:
+                if 0 <= frame_num + offset < total:
+                    self.wanted.setdefault(frame_num + offset, []).append(frame_num)
+
+    def last_frame(self) -> int:
+        return max(self.wanted, default=-1)
+
+    def wants(self, frame_num: int) -> bool:
+        return frame_num in self.wanted
+
+    def _load(self, keyframe: _Keyframe):
+        if keyframe.image is None:
+            keyframe.image = cv2.imread(str(keyframe.frame_path))
+            if keyframe.image is None:
+                raise ValueError(f"Cannot read keyframe {keyframe.frame_path}")
+            keyframe.stabilizer = FrameStabilizer.from_reference(keyframe.image, feature_mask=self.feature_mask)
+
+    def consume(self, frame_num: int, frame: np.ndarray):
+        for keyframe_num in self.wanted[frame_num]:
+            keyframe = self.keyframes[keyframe_num]
+            self._load(keyframe)
+            tr = keyframe.stabilizer.estimate(frame)
+            if tr is None:
+                continue
+
+            warped = _warp_region(frame, tr, self.box, (0, 0, 0)).astype(np.float32)
+            # the neighbour's own text hides the background; outside its frame there is nothing
+            hidden = _warp_region(self.mask, tr, self.box, 255) > 0
+
+            x, y, bw, bh = self.box
+            key_box = keyframe.image[y:y + bh, x:x + bw].astype(np.float32)
+            ring = self.box_ring & ~hidden
+            if ring.sum() < RING_MIN_COVERAGE * self.box_ring.sum():
+                continue
+            ring_diff = np.abs(warped[ring].mean(axis=1) - key_box[ring].mean(axis=1))
+            if np.median(ring_diff) > RING_MAX_DIFF:
+                continue                                # other shot, or a poor alignment
+
+            values = warped[self.box_mask]
+            values[hidden[self.box_mask]] = np.nan
+            keyframe.candidates.append(values)
+
+    def _finish(self, keyframe: _Keyframe):
+        self._load(keyframe)
+        x, y, bw, bh = self.box
+        result = keyframe.image.copy()
+        region = result[y:y + bh, x:x + bw]
+
+        filled = np.zeros(int(self.box_mask.sum()), dtype=bool)
+        if keyframe.candidates:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)     # pixels no neighbour revealed
+                background = np.nanmedian(np.stack(keyframe.candidates), axis=0)
+            filled = ~np.isnan(background).any(axis=1)
+            pixels = region[self.box_mask]
+            pixels[filled] = np.clip(np.round(background[filled]), 0, 255).astype(np.uint8)
+            region[self.box_mask] = pixels
+
+        holes = np.zeros(self.box_mask.shape, dtype=np.uint8)
+        holes[self.box_mask] = np.where(filled, 0, 255)
+        if holes.any():
+            region[:] = cv2.inpaint(region, holes, INPAINT_RADIUS, cv2.INPAINT_TELEA)
+            # inpainting only changes the holes, but keep everything outside the mask bit-exact
+            region[~self.box_mask] = keyframe.image[y:y + bh, x:x + bw][~self.box_mask]
+
+        # lossless (PNG outputs), so the pixels outside the mask stay those of the keyframe
+        if not cv2.imwrite(str(keyframe.output_path), result):
+            raise ValueError(f"Failed to write frame to {keyframe.output_path}")
+        logger.debug(
+            f"Cleaned keyframe {keyframe.frame_num}: {filled.mean():.1%} of the mask from "
+            f"{len(keyframe.candidates)} neighbour(s), the rest inpainted"
+        )
+
+    def finish(self):
+        """Writes every cleaned keyframe"""
+        for keyframe in self.keyframes.values():
+            self._finish(keyframe)
+            keyframe.image = keyframe.stabilizer = None
+            keyframe.candidates = []
+
+
+def remove_text_locally(
+    video_path: str,
+    mask_path: Path,
+    keyframes: Dict[int, Path],
+    outputs: Dict[Path, Path],
+) -> Dict[Path, Path]:
+    """
+    Removes the text overlay from keyframes without a remote model: masked pixels are filled
+    from aligned neighbouring frames where the background shows, and inpainted elsewhere.
+
+    Args:
+        video_path: Video the keyframes were extracted from (decoded around every keyframe)
+        mask_path: Text mask from step 0 (TEXT_MASK_FILE)
+        keyframes: Source frame number -> keyframe path
+        outputs: Keyframe path -> cleaned frame path (PNG: a lossy format would alter the whole frame)
+
+    Returns:
+        Keyframe path -> cleaned frame path (the keyframe itself when the mask is empty)
+    """
+    mask = cv2.imread(str(mask_path), cv2.IMREAD_GRAYSCALE)
+    if mask is None:
+        raise ValueError(f"Cannot read text mask {mask_path}")
+
+    if not mask.any():
+        logger.info("Text mask is empty, keyframes are used as they are")
+        return {frame_path: frame_path for frame_path in keyframes.values()}
+
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    size = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if mask.shape[::-1] != size:
+        mask = cv2.resize(mask, size, interpolation=cv2.INTER_NEAREST)
+
+    fill = BackgroundFill(keyframes, outputs, (mask > 0).astype(np.uint8) * 255, total)
+    logger.info(f"Removing text locally from {len(keyframes)} keyframes ({len(fill.wanted)} neighbouring frames)")
+
+    ingest = VideoIngest(video_path)
+    ingest.add(fill)
+    ingest.run()
+    fill.finish()
+
+    return {frame_path: outputs[frame_path] for frame_path in keyframes.values()}
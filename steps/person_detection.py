@@ -1,7 +1,8 @@
 """Step 3: Detect and describe people in the video"""
 
+import asyncio
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from utils.logger import setup_logger
 from utils.config import Config
@@ -12,6 +13,54 @@ from schemas import VideoInterval, Person
 logger = setup_logger(__name__)
 
 
+def load_frame_detections(
+    input_video_path: Optional[str],
+    cache_manager: Optional[CacheManager],
+) -> Dict[str, List[Person]]:
+    """
+    People step 3 detected in every frame it analyzed, by frame content (CacheManager.file_digest)
+
+    Args:
+        input_video_path: Path to input video for cache key generation
+        cache_manager: Cache manager holding the detections
+
+    Returns:
+        Frame digest -> people in the frame (empty without a cache)
+    """
+    if not (cache_manager and input_video_path):
+        return {}
+    cached_data = cache_manager.load("frame_detections", input_video_path)
+    if not cached_data:
+        return {}
+    return {digest: [Person(**item) for item in people] for digest, people in cached_data.items()}
+
+
+def _relabel_detections(
+    frame_analyses: List[List[Person]],
+    id_maps: List[Dict[str, str]],
+    person_registry: List[Person],
+) -> List[Optional[List[Person]]]:
+    """
+    Per-frame detections carrying the registry IDs instead of the IDs of their own analysis
+
+    Args:
+        frame_analyses: People detected in each frame (IDs local to the frame or batch)
+        id_maps: Per frame, local person ID -> registry person ID (from the consolidation)
+        person_registry: Consolidated people
+
+    Returns:
+        Relabeled people per frame; None for a frame the mapping does not fully cover
+    """
+    registry_ids = {person.person_id for person in person_registry}
+    relabeled = []
+    for people, ids in zip(frame_analyses, id_maps):
+        if all(ids.get(person.person_id) in registry_ids for person in people):
+            relabeled.append([person.model_copy(update={"person_id": ids[person.person_id]}) for person in people])
+        else:
+            relabeled.append(None)
+    return relabeled
+
+
 async def detect_and_describe_people(
     cleaned_video_intervals: List[VideoInterval],
     config: Config,
@@ -42,29 +91,76 @@ async def detect_and_describe_people(
     # Get OpenAI worker
     openai_worker = OpenAIWorker.get_instance()
 
-    # Collect all frames for analysis (both start and end frames in each interval)
+    # Collect all frames for analysis (both start and end frames in each interval,
+    # once each: adjacent intervals share their boundary keyframe)
     frames_to_analyze: list[Path] = []
     for video_interval in cleaned_video_intervals:
-        frames_to_analyze.append(video_interval.start_frame_path)
-        frames_to_analyze.append(video_interval.end_frame_path)
+        for frame_path in (video_interval.start_frame_path, video_interval.end_frame_path):
+            if frame_path not in frames_to_analyze:
+                frames_to_analyze.append(frame_path)
 
     logger.info(f"Analyzing {len(frames_to_analyze)} frames for people")
 
-    # Analyze each frame for people
-    frame_analyses = []
-    for frame_path in frames_to_analyze:
-        analysis = await openai_worker.analyze_frame_for_people(
-            frame_path,
-            config,
-        )
-        frame_analyses.append(analysis)
+    # Analyze all frames at once, at most config.person_analysis_concurrency calls in flight
+    # (gather keeps the frame order for the consolidation)
+    semaphore = asyncio.Semaphore(max(1, config.person_analysis_concurrency))
+
+    async def analyze(frame_path: Path):
+        async with semaphore:
+            return await openai_worker.analyze_frame_for_people(
+                frame_path,
+                config,
+            )
+
+    async def analyze_batch(frame_paths: List[Path]):
+        async with semaphore:
+            try:
+                return await openai_worker.analyze_frames_for_people(frame_paths, config)
+            except Exception as e:
+                logger.warning(f"Batched analysis of {len(frame_paths)} frames failed, analyzing them one by one: {str(e)}")
+        return await asyncio.gather(*(analyze(frame_path) for frame_path in frame_paths)), None
 
-    person_registry = await openai_worker.consolidate_person_descriptions(frame_analyses, config)
+    person_registry = None
+    frame_batches = None
+    batch_size = config.person_analysis_batch_images
+    if batch_size > 1:
+        # Several frames per vision request; each batch also returns its unique individuals
+        batches = [frames_to_analyze[i:i + batch_size] for i in range(0, len(frames_to_analyze), batch_size)]
+        logger.info(f"Analyzing the frames in {len(batches)} batched request(s)")
+        results = await asyncio.gather(*(analyze_batch(batch) for batch in batches))
+        frame_analyses = [people for batch_analyses, _ in results for people in batch_analyses]
+        if len(results) == 1:
+            person_registry = results[0][1]     # identities of a single batch need no consolidation
+        else:
+            # IDs are shared inside a batch only (not after a per-frame fallback)
+            frame_batches = [
+                b if batch_people is not None else None
+                for b, (batch_analyses, batch_people) in enumerate(results)
+                for _ in batch_analyses
+            ]
+    else:
+        frame_analyses = await asyncio.gather(*(analyze(frame_path) for frame_path in frames_to_analyze))
+
+    if person_registry is None:
+        # Frames analyzed separately (or in several batches) number their people independently:
+        # the consolidation also says which registry person each of those IDs is
+        person_registry, id_maps = await openai_worker.consolidate_person_descriptions(
+            frame_analyses, config, frame_batches
+        )
+        frame_analyses = _relabel_detections(frame_analyses, id_maps, person_registry)
+        unmapped = sum(people is None for people in frame_analyses)
+        if unmapped:
+            logger.warning(f"{unmapped} frame(s) have people the consolidation did not map, step 5 detects them again")
     logger.info(f"Detected {len(person_registry)} unique individuals in video")
 
-    # Save to cache
+    # Save to cache (with the per-frame detections, in registry IDs, which step 5 reuses for the same frames)
     if cache_manager and input_video_path:
         cache_data = [person.model_dump(mode='json') for person in person_registry]
         cache_manager.save("person_detection", input_video_path, cache_data)
+        cache_manager.save("frame_detections", input_video_path, {
+            CacheManager.file_digest(frame_path): [person.model_dump(mode='json') for person in people]
+            for frame_path, people in zip(frames_to_analyze, frame_analyses)
+            if people is not None
+        })
 
     return person_registry
@@ -1,28 +1,123 @@
 """Step 7: Reassemble video intervals into final output"""
 
+from collections import Counter
+from dataclasses import replace
+from fractions import Fraction
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional
+import asyncio
 import subprocess
 
+from utils.async_utils import run_process
+from utils.config import Config
+from utils.encoder import CODEC_BACKENDS, encoder_args
 from utils.logger import setup_logger
+from utils.video_probe import probe_video_stream
 
 logger = setup_logger(__name__)
 
+# Stream parameters that must match for a lossless concat
+CONCAT_PROFILE = ("codec", "width", "height", "rate", "time_base", "pix_fmt")
+
+
+async def probe_clip(video_path: str) -> Dict[str, Any]:
+    """
+    Concat profile of a clip (without ffprobe only codec, size and frame rate are known)
+    """
+    info = await probe_video_stream(video_path)
+    return {key: info[key] for key in CONCAT_PROFILE}
+
+
+async def _normalize_clip(video_path: str, target: Dict[str, Any], config: Config):
+    """Re-encodes one clip to the target profile, in place"""
+    codec_config = replace(config, video_codec=target["codec"], video_encoder="auto")
+    args = encoder_args(codec_config if target["codec"] in CODEC_BACKENDS else config)
+    if target["pix_fmt"]:
+        args[args.index("-pix_fmt") + 1] = target["pix_fmt"]
+
+    normalized_path = Path(video_path).with_suffix(".conformed.mp4")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", str(video_path),
+        "-vf", f"scale={target['width']}:{target['height']},setsar=1,fps={target['rate']}",
+        "-an",
+        *args,
+    ]
+    if target["time_base"]:
+        cmd += ["-video_track_timescale", str(Fraction(target["time_base"]).denominator)]
+    cmd += [str(normalized_path)]
+
+    try:
+        await run_process(cmd, check=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Failed to normalize {video_path}: {e.stderr}")
+        raise
+    normalized_path.replace(video_path)
+
+
+async def conform_clips(generated_intervals: List[str], config: Optional[Config] = None) -> List[str]:
+    """
+    Makes the clips safe to concatenate without re-encoding: probes every clip and re-encodes
+    only those that differ from the most common profile (codec, size, frame rate, timebase,
+    pixel format), in place. Usually no clip differs and nothing is encoded.
+
+    Args:
+        generated_intervals: List of paths to generated intervals from Step. 6 (in order)
+        config: Optional configuration (encoder settings)
+
+    Returns:
+        The same paths, now sharing one profile
+    """
+    if len(generated_intervals) < 2:
+        return generated_intervals
+
+    profiles = await asyncio.gather(*(probe_clip(video_interval) for video_interval in generated_intervals))
+    keys = [tuple(sorted(profile.items())) for profile in profiles]
+    target_key = Counter(keys).most_common(1)[0][0]
+    target = dict(target_key)
+
+    mismatched = [i for i, key in enumerate(keys) if key != target_key]
+    if not mismatched:
+        logger.info(f"All {len(generated_intervals)} clips conform, concatenating without re-encoding")
+        return generated_intervals
+
+    logger.warning(
+        f"{len(mismatched)} of {len(generated_intervals)} clips differ from "
+        f"{target['codec']} {target['width']}x{target['height']} @ {target['rate']}, normalizing them"
+    )
+    for i in mismatched:
+        logger.info(f"Normalizing {generated_intervals[i]}: {profiles[i]}")
+        await _normalize_clip(generated_intervals[i], target, config or Config())
+
+    return generated_intervals
+
 
 async def reassemble_video(
     generated_intervals: List[str],
     output_path: Path,
+    audio_source: Optional[str] = None,
+    audio_start: float = 0.0,
+    config: Optional[Config] = None,
 ) -> Path:
     """
     Concatenate all generated intervals into the final video
 
+    The clips carry no audio: the original audio track is stream-copied once onto the
+    concatenated video (no per-interval slices, no re-encode at the seams). Clips that do
+    not match the others are normalized first (see conform_clips).
+
     Args:
         generated_intervals: List of paths to generated intervals from Step. 6 (in order)
         output_path: Path for the reassembled video
+        audio_source: Optional video whose first audio track is laid under the result
+        audio_start: Source time (s) of the first interval, where the audio starts
+        config: Optional configuration (encoder settings for normalized clips)
     """
     logger.info(f"Reassembling {len(generated_intervals)} intervals into final video")
 
     try:
+        generated_intervals = await conform_clips(generated_intervals, config)
+
         # Create a temporary file list for ffmpeg concat
         output_dir = Path(output_path).parent
         output_dir.mkdir(parents=True, exist_ok=True)
@@ -40,6 +135,18 @@ async def reassemble_video(
             '-f', 'concat',
             '-safe', '0',
             '-i', str(concat_file),
+        ]
+        if audio_source:
+            if audio_start > 0:
+                # -c copy: the audio starts on the AAC packet boundary nearest the offset (see render_final_video)
+                cmd += ['-ss', f'{audio_start}']
+            cmd += [
+                '-i', str(audio_source),
+                '-map', '0:v:0',
+                '-map', '1:a:0?',  # Sources without audio stay silent
+                '-shortest',
+            ]
+        cmd += [
             '-c', 'copy',  # Copy streams without re-encoding for speed
             '-y',  # Overwrite output file
             str(output_path),
@@ -47,12 +154,7 @@ async def reassemble_video(
 
         logger.info(f"Running ffmpeg: {' '.join(cmd)}")
 
-        subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
+        await run_process(cmd, check=True)
 
         # Clean up concat file
         concat_file.unlink()
@@ -1,81 +1,201 @@
-"""Step 1: Splits video into fixed intervals"""
+"""Step 1: Splits video into intervals (scene-aware or fixed)"""
 
+import asyncio
+import bisect
+import itertools
+import sys
 import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from utils.logger import setup_logger
 from utils.cache_manager import CacheManager
-from utils.audio_utils import extract_audio
+from utils.config import Config
+from utils.mezzanine import load_frame_index
+from utils.video_ingest import FrameConsumer, VideoIngest
 from schemas import VideoInterval
 
 logger = setup_logger(__name__)
 
 
-def _save_frame(cap, frame_num, path):
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-    ret, frame = cap.read()
-    if not ret:
-        raise ValueError(f"Failed to read frame at position {frame_num}")
-    cv2.imwrite(str(path), frame, [cv2.IMWRITE_JPEG_QUALITY, 100])
+def _write_frame(frame, path):
+    if not cv2.imwrite(str(path), frame, [cv2.IMWRITE_JPEG_QUALITY, 100]):
+        raise ValueError(f"Failed to write frame to {path}")
 
 
-async def split_video_into_intervals(
+class KeyframeWriter(FrameConsumer):
+    """
+    Ingest consumer that saves the interval start & end frames.
+    JPEG encoding runs on a thread pool while decoding continues.
+    """
+
+    def __init__(self, targets: Dict[int, Path], max_workers: int = 4):
+        self.targets = targets
+        self._frame_nums = sorted(targets)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = {}
+
+    def last_frame(self) -> int:
+        return max(self.targets, default=-1)
+
+    def wants(self, frame_num: int) -> bool:
+        return frame_num in self.targets
+
+    def next_wanted(self, frame_num: int) -> int:
+        i = bisect.bisect_left(self._frame_nums, frame_num)
+        return self._frame_nums[i] if i < len(self._frame_nums) else sys.maxsize
+
+    def consume(self, frame_num: int, frame):
+        self.futures[frame_num] = self.pool.submit(_write_frame, frame, self.targets[frame_num])
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        for future in self.futures.values():
+            future.result()
+        missing = sorted(set(self.targets) - set(self.futures))
+        if missing:
+            raise ValueError(f"Failed to read frame at position {missing[0]}")
+
+
+class SceneCutDetector(FrameConsumer):
+    """
+    Ingest consumer that detects hard cuts, so they come from the shared decode.
+
+    Same rules as PySceneDetect's ContentDetector: a frame's score is the mean absolute HSV
+    difference to the previous frame (on a proxy whose longest side is PROXY_SIZE), averaged
+    over the three channels. Cuts are filtered like its default MERGE flash filter: a frame above
+    the threshold only starts a shot when the previous frame above it is at least
+    MIN_SCENE_FRAMES back, so sustained fast motion does not cut; once a cut was found, a burst
+    of close cuts collapses into one, at the burst's last frame above the threshold.
+    """
+
+    PROXY_SIZE = 256                            # longest proxy side the difference is measured at
+    MIN_SCENE_FRAMES = 15                       # shortest shot between two cuts
+
+    def __init__(self, threshold: float, total_frames: int):
+        """
+        Args:
+            threshold: Config.scene_threshold (0..1, scaled to the detector's 0..100 range)
+            total_frames: Frame count from the metadata (0 = unknown: decode to the end)
+        """
+        self.threshold = threshold * 100
+        self.total_frames = total_frames
+        self.cuts: List[int] = []
+        self.frame_count = 0                    # frames actually decoded
+        self._prev = None
+        self._last_above = None                 # last frame above the threshold
+        self._merge_enabled = False             # merging starts after the first cut
+        self._merge_start = None                # first frame of the burst being merged
+
+    def last_frame(self) -> int:
+        return self.total_frames - 1 if self.total_frames > 0 else sys.maxsize
+
+    def wants(self, frame_num: int) -> bool:
+        return True
+
+    def consume(self, frame_num: int, frame):
+        h, w = frame.shape[:2]
+        factor = max(h, w) / self.PROXY_SIZE
+        if factor > 1.0:
+            size = (max(1, round(w / factor)), max(1, round(h / factor)))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV).astype(np.int16)
+        above = self._prev is not None and float(np.abs(hsv - self._prev).mean()) >= self.threshold
+        self._prev = hsv
+        self.frame_count = frame_num + 1
+
+        if self._last_above is None:
+            self._last_above = frame_num
+        gap_met = frame_num - self._last_above >= self.MIN_SCENE_FRAMES
+        if above:
+            self._last_above = frame_num
+
+        if self._merge_start is not None:
+            # merging a burst: it ends once the scores stay below the threshold long enough
+            if gap_met and not above and self._last_above - self._merge_start >= self.MIN_SCENE_FRAMES:
+                self.cuts.append(self._last_above)
+                self._merge_start = None
+        elif above and gap_met:
+            self.cuts.append(frame_num)
+            self._merge_enabled = True
+        elif above and self._merge_enabled:
+            self._merge_start = frame_num
+
+
+def _video_properties(input_video_path: str):
+    """
+    Returns (fps, frame count). A mezzanine's frame index is exact, container metadata may not be.
+    """
+    frame_index = load_frame_index(input_video_path)
+    if frame_index:
+        return frame_index["fps"], frame_index["frame_count"]
+
+    cap = cv2.VideoCapture(input_video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video file: {input_video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, total_frames
+
+
+def detect_scene_cuts(
     input_video_path: str,
-    work_dir: Path,
-    audio_dir: Path,
-    interval: int,
+    threshold: float,
     cache_manager: Optional[CacheManager] = None,
-) -> List[VideoInterval]:
+    detector: Optional[SceneCutDetector] = None,
+) -> Tuple[List[int], int]:
     """
-    Splits video into intervals. Extracts start and end frames for each interval.
-    Only complete intervals are extracted - partial intervals at the end are skipped.
+    Detects hard cuts (see SceneCutDetector).
 
     Args:
         input_video_path: Path to source video
-        work_dir: Working directory for frame outputs
-        audio_dir: Directory for audio outputs
-        interval: Fixed duration in seconds for each interval
+        threshold: Config.scene_threshold (0..1, scaled to the detector's 0..100 range)
         cache_manager: Optional cache manager for caching results
+        detector: Detector that already ran in a shared ingest (else the video is decoded here)
 
     Returns:
-        List of VideoInterval objects containing description for each interval
+        (frame numbers where a new shot starts, number of decoded frames)
     """
-    logger.info(f"Extracting frames at {interval}s intervals from {input_video_path}")
-
-    work_dir.mkdir(parents=True, exist_ok=True)
-    audio_dir.mkdir(parents=True, exist_ok=True)
-
-    # Check cache first
+    params = {"threshold": threshold}
     if cache_manager:
-        cached_data = cache_manager.load("frame_extraction", input_video_path)
+        cached_data = cache_manager.load("scene_cuts", input_video_path, params=params)
         if cached_data:
-            logger.info("Using cached frame extraction results")
-            return [VideoInterval(**item) for item in cached_data]
+            logger.info("Using cached scene cuts")
+            return cached_data["cuts"], cached_data["frame_count"]
 
-    # Open video
-    cap = cv2.VideoCapture(input_video_path)
-    if not cap.isOpened():
-        raise ValueError(f"Cannot open video file: {input_video_path}")
+    if detector is None:
+        logger.info(f"Detecting scene cuts in {input_video_path}")
+        detector = SceneCutDetector(threshold, _video_properties(input_video_path)[1])
+        ingest = VideoIngest(input_video_path)
+        ingest.add(detector)
+        ingest.run()
+    cuts, frame_count = detector.cuts, detector.frame_count
+    logger.info(f"Found {len(cuts)} scene cut(s)")
 
-    # Get video properties
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    duration = total_frames / fps
+    if cache_manager:
+        cache_manager.save("scene_cuts", input_video_path, {"cuts": cuts, "frame_count": frame_count}, params=params)
+
+    return cuts, frame_count
 
-    logger.info(f"Video properties: Duration={duration:.2f}s, FPS={fps}, Total frames={total_frames}")
 
+def _fixed_spans(fps: float, total_frames: int, interval: int) -> List[Tuple[float, float, int, int]]:
+    """
+    Complete fixed-length intervals as (start_time, end_time, start_frame, end_frame); the tail is skipped.
+    An interval ends on the frame the next one starts with.
+    """
     # Calculate frames per interval
     interval_frames = int(fps * interval)
+    duration = total_frames / fps
 
     logger.info(f"Extracting intervals every {interval}s ({interval_frames} frames)")
 
-    frame_pairs = []
-    interval_index = 0
-
+    spans = []
     while True:
         # Calculate start and end times for this interval
-        start_time = interval_index * interval
+        start_time = len(spans) * interval
         end_time = start_time + interval
 
         # Check if we have enough video duration for a complete interval
@@ -94,24 +214,260 @@ async def split_video_into_intervals(
                 f"Skipping incomplete interval at end (would need frames {start_frame_num}-{end_frame_num}, but video ends at frame {total_frames - 1})")
             break
 
-        start_frame_path = work_dir / f"interval_{interval_index:03d}_start.jpg"
-        end_frame_path = work_dir / f"interval_{interval_index:03d}_end.jpg"
+        # End on the next interval's start frame (shared keyframe), while the video has it
+        end_frame_num = min(end_frame_num + 1, total_frames - 1)
 
-        # Extract & save start & end frames
-        _save_frame(cap, start_frame_num, start_frame_path)
-        _save_frame(cap, end_frame_num, end_frame_path)
+        spans.append((start_time, end_time, start_frame_num, end_frame_num))
+
+    return spans
 
-        # Calculate actual duration
-        duration_interval = end_time - start_time
 
-        # Extract audio for this interval
-        audio_path = audio_dir / f"interval_{interval_index:03d}_audio.wav"
-        extract_audio(
-            input_video_path,
-            str(audio_path),
-            start_time=start_time,
-            duration=duration_interval
+def _partition_shot(length: int, accepted: List[int]) -> Tuple[List[int], float]:
+    """
+    Splits a shot of length frames into the fewest pieces: every piece but the last lasts an
+    accepted duration exactly, the last (remainder) is generated at the shortest accepted
+    duration that covers it and sped up.
+
+    Args:
+        length: Shot length in frames
+        accepted: Accepted clip durations in frames, ascending
+
+    Returns:
+        (piece lengths in frames, speed-up factor of the remainder; 1.0 when it is exact)
+    """
+    n = -(-length // accepted[-1])
+    best, best_speedup = None, float("inf")
+    for full in itertools.combinations_with_replacement(reversed(accepted), n - 1):
+        remainder = length - sum(full)
+        if not 0 < remainder <= accepted[-1]:
+            continue
+        speedup = next(d for d in accepted if d >= remainder) / remainder
+        if speedup < best_speedup:
+            best, best_speedup = [*full, remainder], speedup
+    return best, best_speedup
+
+
+def _scene_spans(
+    fps: float,
+    total_frames: int,
+    cuts: List[int],
+    durations: List[float],
+    min_shot_duration: float,
+    max_speedup: float,
+) -> List[Tuple[float, float, int, int]]:
+    """
+    Fewest intervals that cover the whole video without straddling a cut.
+
+    Every shot is split into intervals of the accepted clip durations, plus at most one remainder
+    that the video step speeds up (see _partition_shot). Shots shorter than min_shot_duration
+    (flashes, dissolves detected as several cuts), or whose remainder would need more than
+    max_speedup, are merged into the neighbour that keeps the speed-up smallest; the merged
+    interval then straddles that cut. Inside a shot an interval ends on the frame the next one
+    starts with; the last interval of a shot ends on the shot's last frame.
+    """
+    bounds = [0] + sorted(c for c in set(cuts) if 0 < c < total_frames) + [total_frames]
+    accepted = sorted({max(1, round(d * fps)) for d in durations})
+    min_shot_frames = min_shot_duration * fps
+
+    def speedup(shot):
+        return _partition_shot(shot[1] - shot[0], accepted)[1]
+
+    shots = list(zip(bounds, bounds[1:]))
+    while len(shots) > 1:
+        bad = [i for i, shot in enumerate(shots) if shot[1] - shot[0] < min_shot_frames or speedup(shot) > max_speedup]
+        if not bad:
+            break
+        i = min(bad, key=lambda i: shots[i][1] - shots[i][0])      # shortest first
+        options = [j for j in (i - 1, i + 1) if 0 <= j < len(shots)]
+        j = min(options, key=lambda j: speedup((shots[min(i, j)][0], shots[max(i, j)][1])))
+        cut = shots[max(i, j)][0]
+        logger.warning(
+            f"Shot of {(shots[i][1] - shots[i][0]) / fps:.2f}s merged into its neighbour, "
+            f"an interval straddles the cut at frame {cut}"
         )
+        shots[min(i, j):max(i, j) + 1] = [(shots[min(i, j)][0], shots[max(i, j)][1])]
+
+    spans = []
+    for start, end in shots:
+        pieces, shot_speedup = _partition_shot(end - start, accepted)
+        if shot_speedup > max_speedup:
+            logger.warning(f"Video is too short for the accepted durations, its clip is sped up {shot_speedup:.2f}x")
+        s = start
+        for k, piece in enumerate(pieces):
+            e = s + piece
+            spans.append((s / fps, e / fps, s, e if k < len(pieces) - 1 else e - 1))
+            s = e
+
+    logger.info(f"Planned {len(spans)} intervals over {len(shots)} shot(s)")
+    return spans
+
+
+def _interval_durations(config: Config) -> List[float]:
+    """Accepted clip durations up to max_clip_duration (the shortest one if none fits)"""
+    durations = sorted(config.video_durations)
+    return [d for d in durations if d <= config.max_clip_duration] or durations[:1]
+
+
+def _plan_params(config: Optional[Config]) -> Optional[Dict]:
+    """Planner settings that are part of the cache key (None for fixed intervals)"""
+    if config is None or not config.scene_aware_intervals:
+        return None
+    return {
+        "scene_threshold": config.scene_threshold,
+        "durations": _interval_durations(config),
+        "min_shot_duration": config.min_shot_duration,
+        "max_speedup": config.max_speedup,
+    }
+
+
+def _plan_intervals(
+    input_video_path: str,
+    work_dir: Path,
+    interval: int,
+    config: Optional[Config] = None,
+    cache_manager: Optional[CacheManager] = None,
+    detector: Optional[SceneCutDetector] = None,
+):
+    """
+    Plans the intervals of the video: scene-aware when the config enables it, else fixed windows.
+
+    Adjacent intervals of a shot share their boundary keyframe (the same file), so N intervals
+    need N+1 keyframes and later steps clean, analyze and edit every keyframe once.
+
+    Returns:
+        (fps, list of (index, start_time, end_time, start_frame_num, end_frame_num, start_frame_path,
+        end_frame_path), frame number -> path of every start & end frame)
+    """
+    fps, total_frames = _video_properties(input_video_path)
+    logger.info(f"Video properties: Duration={total_frames / fps:.2f}s, FPS={fps}, Total frames={total_frames}")
+
+    plan_params = _plan_params(config)
+    if plan_params:
+        cuts, decoded_frames = detect_scene_cuts(input_video_path, config.scene_threshold, cache_manager, detector)
+        # the detector decoded the video, so its count is exact (metadata may overstate it)
+        total_frames = decoded_frames or total_frames
+        spans = _scene_spans(
+            fps, total_frames, cuts, plan_params["durations"], plan_params["min_shot_duration"],
+            plan_params["max_speedup"],
+        )
+    else:
+        spans = _fixed_spans(fps, total_frames, interval)
+
+    keyframes = sorted({frame_num for span in spans for frame_num in span[2:]})
+    frame_targets: Dict[int, Path] = {
+        frame_num: work_dir / f"keyframe_{k:03d}.jpg" for k, frame_num in enumerate(keyframes)
+    }
+    logger.info(f"{len(spans)} intervals share {len(frame_targets)} keyframes")
+
+    plan = []
+    for interval_index, (start_time, end_time, start_frame_num, end_frame_num) in enumerate(spans):
+        start_frame_path = frame_targets[start_frame_num]
+        end_frame_path = frame_targets[end_frame_num]
+
+        plan.append((
+            interval_index, start_time, end_time, start_frame_num, end_frame_num, start_frame_path, end_frame_path
+        ))
+
+        logger.info(
+            f"Planned interval {interval_index}: "
+            f"frames {start_frame_num}-{end_frame_num} "
+            f"({start_time:.2f}s - {end_time:.2f}s)"
+        )
+
+    return fps, plan, frame_targets
+
+
+def interval_keyframe_writer(
+    input_video_path: str,
+    work_dir: Path,
+    interval: int,
+    cache_manager: Optional[CacheManager] = None,
+    config: Optional[Config] = None,
+) -> Optional[FrameConsumer]:
+    """
+    Consumer for a shared ingest, so step 1 does not decode the video again.
+
+    When the intervals can be planned before the ingest (fixed intervals, or cached scene cuts)
+    this is the KeyframeWriter. Otherwise the plan needs the cuts first: this is a
+    SceneCutDetector, and split_video_into_intervals writes the keyframes after the ingest,
+    seeking to them instead of decoding the video again.
+
+    Args:
+        input_video_path: Path to source video
+        work_dir: Working directory for frame outputs
+        interval: Fixed duration in seconds for each interval
+        cache_manager: Optional cache manager for caching results
+        config: Optional configuration (enables the scene-aware planner)
+
+    Returns:
+        Consumer to add to the ingest, or None if the intervals are cached
+    """
+    params = _plan_params(config)
+    if cache_manager and cache_manager.load("frame_extraction", input_video_path, params=params):
+        return None
+
+    if params and not (cache_manager and cache_manager.load(
+        "scene_cuts", input_video_path, params={"threshold": config.scene_threshold}
+    )):
+        return SceneCutDetector(config.scene_threshold, _video_properties(input_video_path)[1])
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+    _, _, frame_targets = _plan_intervals(input_video_path, work_dir, interval, config, cache_manager)
+    return KeyframeWriter(frame_targets)
+
+
+async def split_video_into_intervals(
+    input_video_path: str,
+    work_dir: Path,
+    interval: int,
+    cache_manager: Optional[CacheManager] = None,
+    keyframes: Optional[KeyframeWriter] = None,
+    config: Optional[Config] = None,
+) -> List[VideoInterval]:
+    """
+    Splits video into intervals. Extracts start and end frames for each interval.
+
+    With config.scene_aware_intervals, intervals follow the shots (see _scene_spans) and cover
+    the whole video. Otherwise only complete fixed intervals are extracted - partial intervals
+    at the end are skipped.
+
+    Args:
+        input_video_path: Path to source video
+        work_dir: Working directory for frame outputs
+        interval: Fixed duration in seconds for each interval
+        cache_manager: Optional cache manager for caching results
+        keyframes: Consumer from interval_keyframe_writer that ran in a shared ingest
+        config: Optional configuration (enables the scene-aware planner)
+
+    Returns:
+        List of VideoInterval objects containing description for each interval
+    """
+    logger.info(f"Extracting interval frames from {input_video_path}")
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    # Check cache first
+    if cache_manager:
+        cached_data = cache_manager.load("frame_extraction", input_video_path, params=_plan_params(config))
+        if cached_data:
+            logger.info("Using cached frame extraction results")
+            return [VideoInterval(**item) for item in cached_data]
+
+    detector = keyframes if isinstance(keyframes, SceneCutDetector) else None
+    fps, plan, frame_targets = await asyncio.to_thread(
+        _plan_intervals, input_video_path, work_dir, interval, config, cache_manager, detector
+    )
+
+    # Extract & save all start & end frames, seeking over the gaps (unless a shared ingest did)
+    if not isinstance(keyframes, KeyframeWriter):
+        ingest = VideoIngest(input_video_path, seek=True)
+        ingest.add(KeyframeWriter(frame_targets))
+        await asyncio.to_thread(ingest.run)
+
+    frame_pairs = []
+    for interval_index, start_time, end_time, start_frame_num, end_frame_num, start_frame_path, end_frame_path in plan:
+        # Calculate actual duration
+        duration_interval = end_time - start_time
 
         frame_pairs.append(
             VideoInterval(
@@ -122,24 +478,16 @@ async def split_video_into_intervals(
                 end_time=end_time,
                 duration=duration_interval,
                 fps=fps,
-                audio_path=str(audio_path),
+                start_frame=start_frame_num,
+                end_frame=end_frame_num,
             )
         )
 
-        logger.info(
-            f"Extracted interval {interval_index}: "
-            f"frames {start_frame_num}-{end_frame_num} "
-            f"({start_time:.2f}s - {end_time:.2f}s)"
-        )
-
-        interval_index += 1
-
-    cap.release()
     logger.info(f"Extracted {len(frame_pairs)} intervals from video")
 
     # Save to cache
     if cache_manager:
         cache_data = [frame_data.model_dump(mode='json') for frame_data in frame_pairs]
-        cache_manager.save("frame_extraction", input_video_path, cache_data)
+        cache_manager.save("frame_extraction", input_video_path, cache_data, params=_plan_params(config))
 
     return frame_pairs
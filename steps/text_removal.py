@@ -1,8 +1,11 @@
 """Step 2: Remove text from all extracted frames in video intervals"""
 
+import asyncio
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
+from steps.local_text_removal import remove_text_locally
+from utils.async_utils import run_cpu
 from utils.logger import setup_logger
 from utils.config import Config
 from utils.cache_manager import CacheManager
@@ -19,16 +22,24 @@ async def remove_text_from_intervals(
     config: Config,
     input_video_path: Optional[str] = None,
     cache_manager: Optional[CacheManager] = None,
+    source_video_path: Optional[str] = None,
+    text_mask_path: Optional[Path] = None,
 ) -> List[VideoInterval]:
     """
     Remove text from all extracted frames in video intervals
 
+    With config.text_removal_engine == "local" (and the step-0 mask), the text is removed on
+    the CPU from the video itself (see remove_text_locally); otherwise every frame goes
+    through the image editing model.
+
     Args:
         video_intervals: List of FrameData objects with start_frame and end_frame paths
         work_dir: Working directory for cleaned frames
         config: Pipeline configuration
         input_video_path: Optional path to input video for cache key generation
         cache_manager: Optional cache manager for caching results
+        source_video_path: Video the frames were extracted from (local engine)
+        text_mask_path: Text mask from step 0 (local engine)
 
     Returns:
         Updated video_intervals with cleaned frame paths
@@ -37,37 +48,70 @@ async def remove_text_from_intervals(
 
     work_dir.mkdir(parents=True, exist_ok=True)
 
+    local = (
+        config.text_removal_engine == "local"
+        and source_video_path is not None
+        and text_mask_path is not None and Path(text_mask_path).exists()
+    )
+    if config.text_removal_engine == "local" and not local:
+        logger.warning("No text mask or source video for local text removal, using the image editing model")
+    params = {"engine": "local"} if local else None
+
     # Check cache first
     if cache_manager and input_video_path:
-        cached_data = cache_manager.load("text_removal", input_video_path)
+        cached_data = cache_manager.load("text_removal", input_video_path, params=params)
         if cached_data:
             logger.info("Using cached text removal results")
             return [VideoInterval(**item) for item in cached_data]
 
-    fal_client = FalAIWorker.get_instance()
     cleaned_frame_pairs = []
 
-    for video_interval in video_intervals:
-        interval_index = video_interval.index
-        logger.info(f"Processing interval {interval_index}")
-
-        # Process start frame
-        start_cleaned_path = work_dir / f"interval_{interval_index:03d}_start_cleaned.jpg"
-        await remove_text_from_single_frame(
-            video_interval.start_frame_path,
-            start_cleaned_path,
-            fal_client,
-            config
+    # Adjacent intervals share their boundary keyframe: clean every frame once
+    frame_paths = list(dict.fromkeys(
+        frame_path
+        for video_interval in video_intervals
+        for frame_path in (video_interval.start_frame_path, video_interval.end_frame_path)
+    ))
+
+    # the local engine only changes the masked pixels: keep the rest exact with a lossless format
+    suffix = ".png" if local else ".jpg"
+    outputs = {frame_path: work_dir / f"{frame_path.stem}_cleaned{suffix}" for frame_path in frame_paths}
+
+    if local:
+        # Source frame number -> keyframe (intervals from an older cache only carry the times)
+        keyframes: Dict[int, Path] = {}
+        for video_interval in video_intervals:
+            start_frame = video_interval.start_frame
+            if start_frame is None:
+                start_frame = round(video_interval.start_time * video_interval.fps)
+            end_frame = video_interval.end_frame
+            if end_frame is None:
+                end_frame = max(start_frame, round(video_interval.end_time * video_interval.fps) - 1)
+            keyframes[start_frame] = video_interval.start_frame_path
+            keyframes[end_frame] = video_interval.end_frame_path
+
+        cleaned_paths: Dict[Path, Path] = await run_cpu(
+            remove_text_locally, source_video_path, Path(text_mask_path), keyframes, outputs
         )
+    else:
+        fal_client = FalAIWorker.get_instance()
 
-        # Process end frame
-        end_cleaned_path = work_dir / f"interval_{interval_index:03d}_end_cleaned.jpg"
-        await remove_text_from_single_frame(
-            video_interval.end_frame_path,
-            end_cleaned_path,
-            fal_client,
-            config
-        )
+        # All frames at once, at most config.text_removal_concurrency requests in flight
+        semaphore = asyncio.Semaphore(max(1, config.text_removal_concurrency))
+
+        async def clean(frame_path: Path) -> Path:
+            async with semaphore:
+                return await remove_text_from_single_frame(frame_path, outputs[frame_path], fal_client, config)
+
+        logger.info(f"Cleaning {len(frame_paths)} frames, {config.text_removal_concurrency} at a time")
+        cleaned_paths = dict(zip(
+            frame_paths, await asyncio.gather(*(clean(frame_path) for frame_path in frame_paths))
+        ))
+
+    for video_interval in video_intervals:
+        interval_index = video_interval.index
+        start_cleaned_path = cleaned_paths[video_interval.start_frame_path]
+        end_cleaned_path = cleaned_paths[video_interval.end_frame_path]
 
         # Create updated frame data with cleaned paths
         cleaned_data = VideoInterval(
@@ -79,17 +123,19 @@ async def remove_text_from_intervals(
             duration=video_interval.duration,
             fps=video_interval.fps,
             audio_path=video_interval.audio_path,
+            start_frame=video_interval.start_frame,
+            end_frame=video_interval.end_frame,
         )
         cleaned_frame_pairs.append(cleaned_data)
 
         logger.info(f"Cleaned frames for interval {interval_index}")
 
-    logger.info(f"Successfully cleaned all frames")
+    logger.info(f"Successfully cleaned all {len(cleaned_paths)} frames")
 
     # Save to cache
     if cache_manager and input_video_path:
         cache_data = [frame_data.model_dump(mode='json') for frame_data in cleaned_frame_pairs]
-        cache_manager.save("text_removal", input_video_path, cache_data)
+        cache_manager.save("text_removal", input_video_path, cache_data, params=params)
 
     return cleaned_frame_pairs
 
@@ -1,18 +1,71 @@
 """Step 6: Generate new video clips using Veo3.1"""
 
+import asyncio
+import subprocess
 from pathlib import Path
 from typing import List
 
+import cv2
+
 from schemas import VideoInterval
+from utils.async_utils import run_process
 from utils.logger import setup_logger
 from utils.config import Config
+from utils.encoder import encoder_args
 from utils.falai_worker import FalAIWorker
 from utils.download_file import download_file
-from utils.audio_utils import merge_video_audio
 
 logger = setup_logger(__name__)
 
 
+def _model_duration(duration: float, config: Config) -> int:
+    """Shortest clip duration the video model accepts that covers the interval"""
+    accepted = sorted(config.video_durations)
+    return next((d for d in accepted if d >= duration - 0.01), accepted[-1])
+
+
+def _clip_fps(video_path: str) -> float:
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 24
+    cap.release()
+    return fps
+
+
+async def _retime_clip(video_path: str, from_duration: float, to_duration: float, config: Config) -> str:
+    """
+    Retimes the clip so it lasts to_duration (keeps its frame rate), in place
+
+    Args:
+        video_path: Path to the generated clip
+        from_duration: Duration the clip was generated with
+        to_duration: Duration of the interval it replaces
+        config: Pipeline configuration (encoder settings)
+
+    Returns:
+        Path to the retimed clip
+    """
+    fps = await asyncio.to_thread(_clip_fps, video_path)
+
+    retimed_path = Path(video_path).with_suffix(".retimed.mp4")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", video_path,
+        "-vf", f"setpts={to_duration / from_duration:.6f}*PTS,fps={fps}",
+        "-an",
+        *encoder_args(config),
+        str(retimed_path),
+    ]
+    try:
+        await run_process(cmd, check=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Failed to retime clip: {e.stderr}")
+        raise
+
+    retimed_path.replace(video_path)
+    logger.info(f"Retimed {video_path} from {from_duration:.2f}s to {to_duration:.2f}s")
+    return video_path
+
+
 async def generate_single_interval(
     start_frame_path: Path,
     end_frame_path: Path,
@@ -20,10 +73,16 @@ async def generate_single_interval(
     output_path: str,
     prompt: str,
     config: Config,
+    shared_end: bool = False,
 ) -> str:
     """
     Generate a single video interval using Veo3.1
 
+    The model only accepts a few durations (config.video_durations): the clip is generated at
+    the shortest one that covers the interval and sped up to the interval duration.
+    A clip whose end keyframe starts the next clip lasts one (clip) frame longer: the final
+    render drops that keyframe from the next clip, so the seams keep the source timing.
+
     Args:
         start_frame_path: Path to edited start frame
         end_frame_path: Path to edited end frame
@@ -31,6 +90,7 @@ async def generate_single_interval(
         output_path: Where to save generated video
         prompt: Generation instructions
         config: Pipeline configuration
+        shared_end: The end keyframe is also the next interval's start keyframe
 
     Returns:
         Path to generated video
@@ -38,6 +98,8 @@ async def generate_single_interval(
     logger.info(f"Generating video: {output_path}")
 
     try:
+        model_duration = _model_duration(duration, config)
+
         # Get FalAIWorker singleton instance
         fal_client = FalAIWorker.get_instance()
 
@@ -52,7 +114,7 @@ async def generate_single_interval(
                 "prompt": prompt,
                 "first_frame_url": start_url,
                 "last_frame_url": end_url,
-                "duration": f"{round(duration)}s",
+                "duration": f"{model_duration}s",
                 "aspect_ratio": "9:16",
                 "resolution": "720p",
                 "generate_audio": False,    # we will use audio from the original video
@@ -62,6 +124,12 @@ async def generate_single_interval(
         # Download generated video
         video_url = result["video"]["url"]
         download_file_path = await download_file(video_url, str(output_path))
+
+        clip_duration = duration
+        if shared_end:
+            clip_duration += 1.0 / await asyncio.to_thread(_clip_fps, download_file_path)
+        if abs(model_duration - clip_duration) > 0.01:
+            download_file_path = await _retime_clip(download_file_path, model_duration, clip_duration, config)
         return download_file_path
 
     except Exception as e:
@@ -92,49 +160,25 @@ async def generate_video_intervals(
 
     generated_intervals = []
 
-    for video_interval in edited_video_intervals:
+    for i, video_interval in enumerate(edited_video_intervals):
         interval_index = video_interval.index
+        next_interval = edited_video_intervals[i + 1] if i + 1 < len(edited_video_intervals) else None
         logger.info(f"Generating video for interval {interval_index}")
 
         try:
-            # Check if we need to merge audio later
-            has_audio = video_interval.audio_path and Path(video_interval.audio_path).exists()
-
-            # If audio exists, generate to the temp path first
-            if has_audio:
-                temp_output_path = work_dir / f"interval_{interval_index:03d}_generated_no_audio.mp4"
-                final_output_path = work_dir / f"interval_{interval_index:03d}_generated.mp4"
-            else:
-                final_output_path = work_dir / f"interval_{interval_index:03d}_generated.mp4"
-                temp_output_path = final_output_path
-
+            # Clips stay silent: the original audio is laid in once by the reassembly
+            output_path = work_dir / f"interval_{interval_index:03d}_generated.mp4"
             generated_path = await generate_single_interval(
                 video_interval.start_frame_path,
                 video_interval.end_frame_path,
                 video_interval.duration,
-                str(temp_output_path),
+                str(output_path),
                 prompt,
                 config,
+                shared_end=next_interval is not None
+                and next_interval.start_frame_path == video_interval.end_frame_path,
             )
-
-            # Merge with original audio if available
-            if has_audio:
-                logger.info(f"Merging interval {interval_index} with original audio")
-
-                # Merge video with adjusted audio
-                final_path = merge_video_audio(
-                    str(generated_path),
-                    str(video_interval.audio_path),
-                    str(final_output_path)
-                )
-
-                # Clean up temporary files
-                Path(temp_output_path).unlink(missing_ok=True)
-
-                generated_intervals.append(final_path)
-            else:
-                logger.info(f"No audio available for interval {interval_index}")
-                generated_intervals.append(str(final_output_path))
+            generated_intervals.append(str(generated_path))
 
             logger.info(f"Generated interval {interval_index}")
 
@@ -0,0 +1,62 @@
+"""Helpers that keep blocking work off the event loop: subprocesses and CPU-bound calls"""
+
+import asyncio
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, List, Optional
+
+_cpu_pool: Optional[ProcessPoolExecutor] = None
+
+
+async def run_process(cmd: List[str], check: bool = False) -> subprocess.CompletedProcess:
+    """
+    Async counterpart of subprocess.run(cmd, capture_output=True, text=True)
+
+    Args:
+        cmd: Command and arguments
+        check: Raise CalledProcessError on a non-zero exit code
+
+    Returns:
+        CompletedProcess with the decoded stdout and stderr
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        # a cancelled task must not leave e.g. an ffmpeg encode running
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    result = subprocess.CompletedProcess(
+        cmd, proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+    )
+    if check:
+        result.check_returncode()
+    return result
+
+
+def _get_cpu_pool() -> ProcessPoolExecutor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor()
+    return _cpu_pool
+
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """
+    Runs a CPU-bound function in the shared process pool (arguments and result must pickle)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_cpu_pool(), partial(func, *args, **kwargs))
+
+
+def shutdown_cpu_pool():
+    """Stops the shared process pool (it is recreated on the next run_cpu)"""
+    global _cpu_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown()
+        _cpu_pool = None
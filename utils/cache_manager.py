@@ -2,8 +2,9 @@
 
 import json
 import hashlib
+import shutil
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -12,36 +13,99 @@ logger = setup_logger(__name__)
 class CacheManager:
     """Manages caching of pipeline step results"""
 
+    # (path, mtime, size) -> content digest, so a file is hashed once per process
+    _digests: Dict[tuple, str] = {}
+
     def __init__(self, cache_dir: Path):
         self.cache_dir = cache_dir
         self.cache_dir.mkdir(parents=True, exist_ok=True)
 
-    @staticmethod
-    def _generate_cache_key(step_name: str, video_path: str) -> str:
+    @classmethod
+    def file_digest(cls, file_path: str) -> str:
+        """Return the SHA-256 of the file content"""
+        path = Path(file_path)
+        stat = path.stat()
+        memo_key = (str(path.resolve()), stat.st_mtime, stat.st_size)
+        if memo_key not in cls._digests:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            cls._digests[memo_key] = sha.hexdigest()
+        return cls._digests[memo_key]
+
+    @classmethod
+    def _generate_cache_key(
+        cls,
+        step_name: str,
+        video_path: str,
+        params: Optional[Dict[str, Any]] = None,
+        by_content: bool = False,
+    ) -> str:
         """Generate a unique cache key based on step name, video path, and parameters"""
-        # Get video file hash (using modification time and size for efficiency)
         video_file = Path(video_path)
-        if video_file.exists():
-            video_hash = f"{video_file.stat().st_mtime}_{video_file.stat().st_size}"
+        if by_content and video_file.exists():
+            # Content-addressed: the same video hits the cache under any path
+            key_components = f"{step_name}_{cls.file_digest(video_path)}"
         else:
-            video_hash = "unknown"
+            # Get video file hash (using modification time and size for efficiency)
+            if video_file.exists():
+                video_hash = f"{video_file.stat().st_mtime}_{video_file.stat().st_size}"
+            else:
+                video_hash = "unknown"
+
+            # Combine all components
+            key_components = f"{step_name}_{video_path}_{video_hash}"
 
-        # Combine all components
-        key_components = f"{step_name}_{video_path}_{video_hash}"
+        if params:
+            key_components += f"_{json.dumps(params, sort_keys=True, default=str)}"
 
         # Generate MD5 hash for a clean filename
         cache_key = hashlib.md5(key_components.encode()).hexdigest()
 
         return cache_key
 
-    def get_cache_path(self, step_name: str, video_path: str) -> Path:
+    def get_cache_path(
+        self,
+        step_name: str,
+        video_path: str,
+        params: Optional[Dict[str, Any]] = None,
+        by_content: bool = False,
+    ) -> Path:
         """Get the cache file path for a specific step"""
-        cache_key = self._generate_cache_key(step_name, video_path)
+        cache_key = self._generate_cache_key(step_name, video_path, params, by_content)
         return self.cache_dir / f"{step_name}_{cache_key}.json"
 
-    def load(self, step_name: str, video_path: str) -> Optional[Any]:
+    def get_artifact_dir(
+        self,
+        step_name: str,
+        video_path: str,
+        params: Optional[Dict[str, Any]] = None,
+        by_content: bool = False,
+    ) -> Path:
+        """Get (and create) a directory for files owned by a cache entry"""
+        artifact_dir = self.get_cache_path(step_name, video_path, params, by_content).with_suffix("")
+        artifact_dir.mkdir(parents=True, exist_ok=True)
+        return artifact_dir
+
+    @staticmethod
+    def _referenced_files_exist(item: Dict[str, Any]) -> bool:
+        for key, value in item.items():
+            if isinstance(value, str) and key.endswith(('_frame', '_path', 'frame_path')):
+                if not Path(value).exists():
+                    logger.info(f"Cache invalid: referenced file {value} no longer exists")
+                    return False
+        return True
+
+    def load(
+        self,
+        step_name: str,
+        video_path: str,
+        params: Optional[Dict[str, Any]] = None,
+        by_content: bool = False,
+    ) -> Optional[Any]:
         """Load cached results if they exist"""
-        cache_path = self.get_cache_path(step_name, video_path)
+        cache_path = self.get_cache_path(step_name, video_path, params, by_content)
 
         if not cache_path.exists():
             logger.info(f"No cache found for {step_name}")
@@ -52,14 +116,10 @@ class CacheManager:
                 data = json.load(f)
 
             # Verify that all referenced files still exist
-            if isinstance(data, list):
-                for item in data:
-                    if isinstance(item, dict):
-                        for key, value in item.items():
-                            if isinstance(value, str) and key.endswith(('_frame', '_path', 'frame_path')):
-                                if not Path(value).exists():
-                                    logger.info(f"Cache invalid: referenced file {value} no longer exists")
-                                    return None
+            items = data if isinstance(data, list) else [data]
+            for item in items:
+                if isinstance(item, dict) and not self._referenced_files_exist(item):
+                    return None
 
             logger.info(f"Loaded cached results for {step_name} from {cache_path}")
             return data
@@ -67,9 +127,16 @@ class CacheManager:
             logger.warning(f"Failed to load cache for {step_name}: {str(e)}")
             return None
 
-    def save(self, step_name: str, video_path: str, data: Any):
+    def save(
+        self,
+        step_name: str,
+        video_path: str,
+        data: Any,
+        params: Optional[Dict[str, Any]] = None,
+        by_content: bool = False,
+    ):
         """Save results to cache"""
-        cache_path = self.get_cache_path(step_name, video_path)
+        cache_path = self.get_cache_path(step_name, video_path, params, by_content)
 
         try:
             with open(cache_path, 'w') as f:
@@ -82,15 +149,19 @@ class CacheManager:
     def clear(self, step_name: Optional[str] = None):
         """Clear cache files. If step_name is provided, only clear that step's cache"""
         if step_name:
-            pattern = f"{step_name}_*.json"
+            pattern = f"{step_name}_*"
         else:
-            pattern = "*.json"
+            pattern = "*"
 
         deleted_count = 0
         for cache_file in self.cache_dir.glob(pattern):
             try:
-                cache_file.unlink()
-                deleted_count += 1
+                if cache_file.is_dir():
+                    # Artifact directory of a cache entry
+                    shutil.rmtree(cache_file)
+                elif cache_file.suffix == ".json":
+                    cache_file.unlink()
+                    deleted_count += 1
             except Exception as e:
                 logger.warning(f"Failed to delete cache file {cache_file}: {str(e)}")
 
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,8 +16,23 @@ class Config:
     img2img_model: str = "fal-ai/nano-banana/edit"
     video_model: str = "fal-ai/veo3.1/first-last-frame-to-video"
 
+    # Text layer settings
+    reuse_text_layers: bool = True  # Match new videos against previously extracted layers
+    text_layer_library_dir: Optional[str] = None  # Shared across campaigns; defaults to <work_dir>/text_layer_library
+
+    # Ingest settings
+    use_mezzanine: bool = False  # Transcode the source once into a CFR, short-GOP copy read by steps 0 and 1
+    mezzanine_gop: int = 8  # Frames between keyframes (1 = all-intra)
+    mezzanine_crf: int = 12  # Near-lossless
+    mezzanine_fps: Optional[float] = None  # Defaults to the source's average frame rate
+    ingest_spill_max_mb: float = 1024  # Disk budget for the step-0 samples the ingest keeps until step 0 is done:
+    # full-res BGR, up to ~250 frames (~650 MB at 720p, ~1.5 GB at 1080p); above it step 0 decodes the video itself
+
     # Video segmentation settings
+    scene_aware_intervals: bool = True  # Plan intervals on shot boundaries instead of fixed frame_interval windows
     max_clip_duration: float = 8.0
+    min_shot_duration: float = 1.0  # Shorter shots are merged into a neighbour
+    max_speedup: float = 1.5  # Max retime of a generated clip; shots that would need more are merged into a neighbour
     scene_threshold: float = 0.3  # For scene detection
 
     # Frame extraction settings
@@ -24,10 +40,31 @@ class Config:
     frame_format: str = "jpg"
     frame_quality: int = 95
 
+    # Text removal settings
+    text_removal_engine: str = "local"  # "local" (step-0 mask + neighbouring frames, CPU only) | "remote" (image edit model)
+    text_removal_concurrency: int = 8  # Frames cleaned in parallel (in-flight image edit requests)
+
+    # Person detection settings
+    person_analysis_concurrency: int = 8  # In-flight vision requests
+    person_analysis_batch_images: int = 8  # Frames per vision request, identities included (1 = one frame per request)
+
     # Video generation settings
+    video_durations: tuple = (4, 6, 8)  # Clip durations (s) the video model accepts
     video_fps: int = 30
     video_resolution: tuple = (1080, 1920)  # Width x Height
 
+    # Encoding settings
+    video_encoder: str = "auto"  # ffmpeg encoder name, or "auto" for the fastest working backend of video_codec
+    video_codec: str = "h264"  # "h264" | "hevc" | "av1"
+    encoder_preset: str = "balanced"  # "fast" | "balanced" | "quality"
+    encoder_calibration_path: Optional[str] = None  # Benchmark results guiding "auto" (python -m utils.encoder)
+
+    # Final render settings
+    render_chunk_parallel: bool = False  # Encode the overlay per interval in parallel processes, then concat losslessly
+    render_workers: int = 0  # Parallel chunk encodes (0 = one per 4 CPUs)
+    renditions: tuple = ()  # Extra outputs from the same render: (name, width, height, max bitrate or None),
+    # e.g. (("tiktok", 1080, 1920, "8M"), ("stories_540p", 540, 960, "2M")); same aspect ratio as the clips
+
     # Prompts directory
     prompts_dir: str = "prompts"
 
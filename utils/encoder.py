@@ -0,0 +1,232 @@
+"""Video encoder selection: probes the local ffmpeg and maps speed/quality presets to encoder arguments"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.config import Config
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Encoder arguments per speed/quality preset
+ENCODER_PRESETS: Dict[str, Dict[str, List[str]]] = {
+    "h264_videotoolbox": {
+        "fast": ["-q:v", "55", "-realtime", "1"],
+        "balanced": ["-q:v", "65"],
+        "quality": ["-q:v", "75"],
+    },
+    "h264_nvenc": {
+        "fast": ["-preset", "p2", "-rc", "vbr", "-cq", "23", "-b:v", "0"],
+        "balanced": ["-preset", "p4", "-rc", "vbr", "-cq", "21", "-b:v", "0"],
+        "quality": ["-preset", "p6", "-rc", "vbr", "-cq", "19", "-b:v", "0"],
+    },
+    "libx264": {
+        "fast": ["-preset", "veryfast", "-crf", "20", "-threads", "0"],
+        "balanced": ["-preset", "medium", "-crf", "18", "-threads", "0"],
+        "quality": ["-preset", "slow", "-crf", "16", "-threads", "0"],
+    },
+    "hevc_videotoolbox": {
+        "fast": ["-q:v", "55", "-realtime", "1", "-tag:v", "hvc1"],
+        "balanced": ["-q:v", "65", "-tag:v", "hvc1"],
+        "quality": ["-q:v", "75", "-tag:v", "hvc1"],
+    },
+    "hevc_nvenc": {
+        "fast": ["-preset", "p2", "-rc", "vbr", "-cq", "25", "-b:v", "0", "-tag:v", "hvc1"],
+        "balanced": ["-preset", "p4", "-rc", "vbr", "-cq", "23", "-b:v", "0", "-tag:v", "hvc1"],
+        "quality": ["-preset", "p6", "-rc", "vbr", "-cq", "21", "-b:v", "0", "-tag:v", "hvc1"],
+    },
+    "libx265": {
+        "fast": ["-preset", "veryfast", "-crf", "24", "-tag:v", "hvc1"],
+        "balanced": ["-preset", "medium", "-crf", "22", "-tag:v", "hvc1"],
+        "quality": ["-preset", "slow", "-crf", "20", "-tag:v", "hvc1"],
+    },
+    "av1_nvenc": {
+        "fast": ["-preset", "p2", "-rc", "vbr", "-cq", "32", "-b:v", "0"],
+        "balanced": ["-preset", "p4", "-rc", "vbr", "-cq", "30", "-b:v", "0"],
+        "quality": ["-preset", "p6", "-rc", "vbr", "-cq", "28", "-b:v", "0"],
+    },
+    "libsvtav1": {
+        "fast": ["-preset", "10", "-crf", "35"],
+        "balanced": ["-preset", "8", "-crf", "30"],
+        "quality": ["-preset", "5", "-crf", "26"],
+    },
+}
+
+# Backends per codec family, in order of preference when no calibration is available
+# (hardware encoders first; they are only used if a test encode succeeds)
+CODEC_BACKENDS: Dict[str, List[str]] = {
+    "h264": ["h264_videotoolbox", "h264_nvenc", "libx264"],
+    "hevc": ["hevc_videotoolbox", "hevc_nvenc", "libx265"],
+    "av1": ["av1_nvenc", "libsvtav1"],
+}
+
+_PLATFORM_ONLY = {"videotoolbox": "Darwin"}
+
+
+@lru_cache(maxsize=1)
+def available_encoders() -> frozenset:
+    """Names of the video encoders compiled into the local ffmpeg (probed once)"""
+    try:
+        res = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True)
+    except FileNotFoundError:
+        logger.warning("ffmpeg not found, no encoders available")
+        return frozenset()
+
+    names = set()
+    for line in res.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith("V") and len(parts[0]) == 6:
+            names.add(parts[1])
+    return frozenset(names)
+
+
+@lru_cache(maxsize=None)
+def encoder_works(encoder: str) -> bool:
+    """
+    Whether the encoder can actually encode here (hardware encoders are often compiled in
+    without a device). Runs a tiny test encode once per encoder.
+    """
+    if encoder not in available_encoders():
+        return False
+    for suffix, system in _PLATFORM_ONLY.items():
+        if suffix in encoder and platform.system() != system:
+            return False
+
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", "color=c=gray:size=256x256:rate=30:duration=0.2",
+        "-c:v", encoder, "-pix_fmt", "yuv420p",
+        "-f", "null", "-",
+    ]
+    works = subprocess.run(cmd, capture_output=True, text=True).returncode == 0
+    if not works:
+        logger.info(f"Encoder {encoder} is compiled in but does not work on this machine")
+    return works
+
+
+def _load_calibration(path: Optional[str]) -> Dict[str, Dict[str, float]]:
+    if not path or not Path(path).exists():
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get("fps", {})
+    except Exception as e:
+        logger.warning(f"Failed to load encoder calibration {path}: {str(e)}")
+        return {}
+
+
+def select_encoder(config: Config) -> str:
+    """
+    Encoder for config.video_encoder, or for "auto" the fastest working backend of
+    config.video_codec: by measured fps when a calibration exists, else by preference order.
+    """
+    if config.video_encoder != "auto":
+        return config.video_encoder
+    return _select_auto(config.video_codec, config.encoder_preset, config.encoder_calibration_path)
+
+
+@lru_cache(maxsize=None)
+def _select_auto(codec: str, preset: str, calibration_path: Optional[str]) -> str:
+    backends = CODEC_BACKENDS.get(codec)
+    if not backends:
+        raise ValueError(f"Unknown video codec: {codec} (expected one of {', '.join(CODEC_BACKENDS)})")
+
+    candidates = [encoder for encoder in backends if encoder_works(encoder)]
+    if not candidates:
+        raise RuntimeError(f"No working {codec} encoder in the local ffmpeg (tried {', '.join(backends)})")
+
+    calibration = _load_calibration(calibration_path)
+    measured = [encoder for encoder in candidates if preset in calibration.get(encoder, {})]
+    if measured:
+        encoder = max(measured, key=lambda name: calibration[name][preset])
+    else:
+        encoder = candidates[0]
+
+    logger.info(f"Selected video encoder {encoder} ({codec}, {preset})")
+    return encoder
+
+
+def encoder_args(config: Config, threads: Optional[int] = None) -> List[str]:
+    """
+    ffmpeg output arguments for the selected encoder and config.encoder_preset
+
+    Args:
+        config: Configuration (encoder settings)
+        threads: Optional encoder thread count (for several encodes running side by side)
+    """
+    encoder = select_encoder(config)
+    presets = ENCODER_PRESETS.get(encoder, {})
+    if presets and config.encoder_preset not in presets:
+        raise ValueError(f"Unknown encoder preset: {config.encoder_preset} (expected one of {', '.join(presets)})")
+
+    args = list(presets.get(config.encoder_preset, []))
+    if threads is not None:
+        if "-threads" in args:
+            i = args.index("-threads")
+            del args[i:i + 2]
+        args += ["-threads", str(threads)]
+    return ["-c:v", encoder, *args, "-pix_fmt", "yuv420p"]
+
+
+def calibrate_encoders(
+    output_path: str,
+    duration: float = 2.0,
+    size: tuple = (1080, 1920),
+    fps: int = 30,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Short benchmark: encodes a synthetic clip with every working encoder and preset and
+    records the encode speed (frames per second) on this machine.
+
+    Args:
+        output_path: JSON file for the results (use it as Config.encoder_calibration_path)
+        duration: Length of the test clip in seconds
+        size: Test clip (width, height)
+        fps: Test clip frame rate
+
+    Returns:
+        encoder -> preset -> encode fps
+    """
+    frames = int(duration * fps)
+    results: Dict[str, Dict[str, float]] = {}
+
+    for encoder, presets in ENCODER_PRESETS.items():
+        if not encoder_works(encoder):
+            continue
+        for preset, args in presets.items():
+            cmd = [
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size={size[0]}x{size[1]}:rate={fps}:duration={duration}",
+                "-c:v", encoder, *args, "-pix_fmt", "yuv420p",
+                "-f", "null", "-",
+            ]
+            start = time.perf_counter()
+            res = subprocess.run(cmd, capture_output=True, text=True)
+            elapsed = time.perf_counter() - start
+            if res.returncode != 0:
+                logger.warning(f"Calibration of {encoder} ({preset}) failed: {res.stderr.strip()}")
+                continue
+            results.setdefault(encoder, {})[preset] = round(frames / elapsed, 1)
+            logger.info(f"{encoder} ({preset}): {results[encoder][preset]} fps")
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump({
+            "machine": platform.node(),
+            "cpus": os.cpu_count(),
+            "clip": {"size": list(size), "fps": fps, "duration": duration},
+            "fps": results,
+        }, f, indent=2)
+
+    logger.info(f"Saved encoder calibration to {output_path}")
+    return results
+
+
+if __name__ == "__main__":
+    calibrate_encoders(str(Path(Config().work_dir) / "encoder_calibration.json"))
@@ -0,0 +1,124 @@
+"""Mezzanine transcode: a CFR, short-GOP copy of the source plus a persisted frame index"""
+
+import asyncio
+import json
+from fractions import Fraction
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.async_utils import run_process
+from utils.cache_manager import CacheManager
+from utils.config import Config
+from utils.logger import setup_logger
+from utils.video_probe import probe_video_stream
+
+logger = setup_logger(__name__)
+
+MEZZANINE_FILE = "mezzanine.mp4"
+
+
+def frame_index_path(video_path: str) -> Path:
+    """Path of the frame index that sits next to a mezzanine"""
+    return Path(video_path).with_suffix(".index.json")
+
+
+def load_frame_index(video_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Frame index of a mezzanine (None for any other video)
+
+    The mezzanine is constant frame rate, so frame n is shown at n / fps; the index
+    records the exact frame count and keyframe spacing that container metadata may not.
+    """
+    index_path = frame_index_path(video_path)
+    if not index_path.exists():
+        return None
+    try:
+        with open(index_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to load frame index {index_path}: {str(e)}")
+        return None
+
+
+async def create_mezzanine(
+    input_video_path: str,
+    work_dir: Path,
+    config: Config,
+    cache_manager: Optional[CacheManager] = None,
+) -> str:
+    """
+    Transcodes the source once into a constant frame rate, short-GOP mezzanine (audio is copied)
+    and writes its frame index next to it.
+
+    Phone footage is often VFR with long GOPs: seeks re-decode from a distant keyframe and
+    `int(t * fps)` frame math drifts. The mezzanine fixes both. With a cache manager it lives
+    in the cache, keyed by the source content, so reruns and other themes reuse it.
+
+    Args:
+        input_video_path: Path to source video
+        work_dir: Output directory when no cache manager is given
+        config: Configuration object (mezzanine_gop, mezzanine_crf, mezzanine_fps)
+        cache_manager: Optional cache manager for caching results
+
+    Returns:
+        Path to the mezzanine video
+    """
+    params = {"gop": config.mezzanine_gop, "crf": config.mezzanine_crf, "fps": config.mezzanine_fps}
+
+    # Check cache first
+    if cache_manager:
+        # keyed by content: the first lookup hashes the whole source
+        cached_data = await asyncio.to_thread(
+            cache_manager.load, "mezzanine", input_video_path, params=params, by_content=True
+        )
+        if cached_data and frame_index_path(cached_data["mezzanine_path"]).exists():
+            logger.info("Using cached mezzanine")
+            return cached_data["mezzanine_path"]
+        out_dir = cache_manager.get_artifact_dir("mezzanine", input_video_path, params=params, by_content=True)
+    else:
+        out_dir = Path(work_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    out_path = out_dir / MEZZANINE_FILE
+    source = await probe_video_stream(input_video_path)
+    rate = str(config.mezzanine_fps) if config.mezzanine_fps else source["avg_rate"]
+    gop = max(1, config.mezzanine_gop)
+
+    logger.info(f"Transcoding mezzanine at {rate} fps, GOP {gop}: {input_video_path}")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", str(input_video_path),
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-vsync", "cfr", "-r", rate,
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(config.mezzanine_crf),
+        "-pix_fmt", "yuv420p",
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0", "-bf", "0",
+        "-c:a", "copy",
+        "-movflags", "+faststart",
+        str(out_path),
+    ]
+    res = await run_process(cmd)
+    if res.returncode != 0 or not out_path.exists():
+        raise RuntimeError(f"Mezzanine transcode failed: {res.stderr.strip()}")
+
+    mezzanine = await probe_video_stream(str(out_path), count_frames=True)
+    fps = float(Fraction(mezzanine["avg_rate"]))
+    index = {
+        "source": str(input_video_path),
+        "fps": fps,
+        "frame_count": mezzanine["frame_count"],
+        "duration": mezzanine["frame_count"] / fps,
+        "width": mezzanine["width"],
+        "height": mezzanine["height"],
+        "gop": gop,
+    }
+    with open(frame_index_path(str(out_path)), 'w') as f:
+        json.dump(index, f, indent=2)
+
+    logger.info(f"Mezzanine ready: {index['frame_count']} frames at {fps:.3f} fps -> {out_path}")
+
+    # Save to cache
+    if cache_manager:
+        cache_manager.save("mezzanine", input_video_path, {"mezzanine_path": str(out_path)}, params=params, by_content=True)
+
+    return str(out_path)
@@ -2,7 +2,7 @@ import base64
 import json
 import os
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from openai import AsyncOpenAI
 from utils.logger import setup_logger
 from utils.config import Config
@@ -104,31 +104,106 @@ class OpenAIWorker:
             logger.error(f"Failed to analyze frame: {str(e)}")
             return []
 
+    async def analyze_frames_for_people(
+        self,
+        image_paths: List[Path],
+        config: Config,
+    ) -> Tuple[List[List[Person]], List[Person]]:
+        """
+        Analyze several frames in one request: the people in each frame and the unique
+        individuals across them (no separate consolidation call needed)
+
+        Args:
+            image_paths: Paths to the frame images
+            config: Pipeline configuration
+
+        Returns:
+            (people per frame, in the order of image_paths, using the consolidated IDs;
+            consolidated person profiles)
+        """
+        try:
+            prompt = config.get_prompt("analyse_frames_for_people").format(num_frames=len(image_paths))
+
+            content = [{"type": "text", "text": prompt}]
+            for frame_number, image_path in enumerate(image_paths, start=1):
+                with open(image_path, "rb") as image_file:
+                    image_data = base64.b64encode(image_file.read()).decode('utf-8')
+                content.append({"type": "text", "text": f"Frame {frame_number}:"})
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/png;base64,{image_data}"
+                    }
+                })
+
+            response = await self.client.beta.chat.completions.parse(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": content}],
+                max_tokens=1000 + 500 * len(image_paths),
+                temperature=0.3
+            )
+            raw_content = response.choices[0].message.content
+            logger.info(f"Response: {raw_content}")
+
+            # Remove Markdown code fences if they exist
+            if raw_content.startswith("```"):
+                raw_content = raw_content.strip().lstrip("`")
+                if raw_content.startswith("json"):
+                    raw_content = raw_content[len("json"):].lstrip()
+
+                if raw_content.endswith("```"):
+                    raw_content = raw_content[: -3].strip()
+
+            result = json.loads(raw_content)
+
+            frame_people: Dict[int, List[Person]] = {
+                int(frame["frame"]): [Person(**p) for p in frame.get("people", [])]
+                for frame in result.get("frames", [])
+            }
+            people_per_frame = [frame_people.get(i, []) for i in range(1, len(image_paths) + 1)]
+            people = [Person(**p) for p in result.get("people", [])]
+            logger.info(f"Detected {len(people)} unique individuals in {len(image_paths)} frames")
+            return people_per_frame, people
+
+        except Exception as e:
+            logger.error(f"Failed to analyze frames: {str(e)}")
+            raise
+
     async def consolidate_person_descriptions(
         self,
-        frame_analyses: List[Dict],
+        frame_analyses: List[List[Person]],
         config: Config,
-    ) -> List[Person]:
+        frame_batches: Optional[List[Optional[int]]] = None,
+    ) -> Tuple[List[Person], List[Dict[str, str]]]:
         """
         Consolidate person descriptions across frames to create consistent identities
 
         Args:
-            frame_analyses: List of frame analysis results
+            frame_analyses: People detected in each frame (IDs are only unique within a frame)
             config: Pipeline configuration
+            frame_batches: Optional batch number per frame: frames analyzed in the same request
+                share their person IDs (None for a frame analyzed on its own)
 
         Returns:
-            List of consolidated person profiles
+            (consolidated person profiles; per frame, in the order of frame_analyses, the
+            frame's person ID -> consolidated person ID)
         """
         logger.info("Consolidating person descriptions across frames")
 
         try:
             prompt_template = config.get_prompt("persons_description")
-            prompt = prompt_template.format(frame_analyses=frame_analyses)
+            frames = []
+            for frame_number, people in enumerate(frame_analyses, start=1):
+                frame = {"frame": frame_number, "people": [person.model_dump(mode='json') for person in people]}
+                if frame_batches and frame_batches[frame_number - 1] is not None:
+                    frame["batch"] = frame_batches[frame_number - 1]
+                frames.append(frame)
+            prompt = prompt_template.format(frame_analyses=json.dumps(frames, indent=2))
 
             response = await self.client.beta.chat.completions.parse(
                 model="gpt-4o",
                 messages=[{"role": "user", "content": prompt}],
-                max_tokens=2000,
+                max_tokens=2000 + 50 * len(frame_analyses),
                 temperature=0.3
             )
 
@@ -147,7 +222,12 @@ class OpenAIWorker:
             logger.info(f"Consolidated into {len(result['people'])} unique individuals")
 
             people = [Person(**p) for p in result["people"]]
-            return people
+            frame_ids: Dict[int, Dict[str, str]] = {
+                int(frame["frame"]): dict(frame.get("ids", {}))
+                for frame in result.get("frames", [])
+            }
+            id_maps = [frame_ids.get(i, {}) for i in range(1, len(frame_analyses) + 1)]
+            return people, id_maps
 
         except Exception as e:
             logger.error(f"Failed to consolidate person descriptions: {str(e)}")
@@ -0,0 +1,225 @@
+"""Library of previously extracted text layers for reuse across videos"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class TextLayerLibrary:
+    """
+    Stores extracted text layers (text_rgba.png + mask) indexed by a cheap fingerprint,
+    so a video carrying an already known overlay can reuse it instead of re-extracting.
+
+    The fingerprint is a sparse sample of the mask (interior text pixels, spread over the
+    layer) with their colours; thin strokes would vanish from a downscaled grid. A video is
+    screened against it with a handful of frames (those pixels must show the layer colour in
+    most frames), then verified against every text pixel of the layer. A verified layer is
+    still rejected when the video carries more static edges outside it (extra overlay text
+    the layer would drop).
+
+    The index is shared by concurrent runs: it is read and updated under a file lock and
+    replaced atomically.
+    """
+
+    FP_POINTS = 256             # mask pixels in a fingerprint
+    FP_INTERIOR_DIST = 2.0      # prefer pixels at least this far from the stroke edge (no anti-aliasing)
+    FP_COLOR_TOL = 24.0         # max distance of the per-pixel median colour across the probe frames
+    FP_MIN_SCORE = 0.9          # fraction of fingerprint pixels that must agree to try verification
+
+    PIXEL_TOL = 40              # per-channel tolerance of a text pixel in the full verification
+    MATCH_MIN = 0.85            # median fraction of matching text pixels across probe frames
+
+    EXTRA_PROXY_SCALE = 0.25    # resolution of the extra static edge check
+    EXTRA_MASK_DILATE = 3       # proxy px grown around the layer mask before looking for extra edges
+    EXTRA_EDGE_MAX = 0.2        # max static edges outside the layer, relative to those inside it
+
+    def __init__(self, library_dir: Path):
+        self.library_dir = library_dir
+        self.library_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.library_dir / "index.json"
+
+    @contextmanager
+    def _locked(self, exclusive: bool = False):
+        """Holds the library lock (shared for reads, exclusive for updates)"""
+        with open(self.library_dir / "index.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_index(self) -> List[Dict[str, Any]]:
+        if not self.index_path.exists():
+            return []
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            # an empty index would be written back by add() and lose every entry
+            raise ValueError(f"Text layer library index {self.index_path} is corrupt: {str(e)}") from e
+
+    def _save_index(self, entries: List[Dict[str, Any]]):
+        tmp_path = self.index_path.with_name(f"{self.index_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    @classmethod
+    def _fingerprint(cls, rgba: np.ndarray) -> Dict[str, list]:
+        """Sampled mask pixels ([y, x]) and their BGR colour"""
+        text = (rgba[:, :, 3] > 0).astype(np.uint8)
+        dist = cv2.distanceTransform(text, cv2.DIST_L2, 3)
+
+        ys, xs = np.nonzero(text)
+        interior = dist[ys, xs] >= cls.FP_INTERIOR_DIST
+        if interior.sum() >= cls.FP_POINTS:
+            ys, xs = ys[interior], xs[interior]
+
+        # evenly spaced over the (row-major) text pixels, so the sample covers the whole layer
+        pick = np.unique(np.linspace(0, len(ys) - 1, min(cls.FP_POINTS, len(ys))).astype(int))
+        ys, xs = ys[pick], xs[pick]
+        return {
+            "points": np.stack([ys, xs], axis=1).tolist(),
+            "colors": rgba[ys, xs, :3].tolist(),
+        }
+
+    def add(self, text_layer_path: Path, mask_path: Path) -> Optional[str]:
+        """
+        Add an extracted layer to the library
+
+        Args:
+            text_layer_path: Path to the BGRA text layer
+            mask_path: Path to its mask
+
+        Returns:
+            Entry id, or None if the layer is empty
+        """
+        rgba = cv2.imread(str(text_layer_path), cv2.IMREAD_UNCHANGED)
+        if rgba is None or rgba.ndim != 3 or rgba.shape[2] != 4 or not (rgba[:, :, 3] > 0).any():
+            logger.info("Text layer is empty, not adding it to the library")
+            return None
+
+        entry_id = hashlib.sha256(Path(text_layer_path).read_bytes()).hexdigest()[:16]
+        with self._locked(exclusive=True):
+            entries = self._load_index()
+            if any(entry["id"] == entry_id for entry in entries):
+                return entry_id
+
+            entry_dir = self.library_dir / entry_id
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            layer_copy = shutil.copyfile(text_layer_path, entry_dir / Path(text_layer_path).name)
+            mask_copy = shutil.copyfile(mask_path, entry_dir / Path(mask_path).name)
+
+            h, w = rgba.shape[:2]
+            entries.append({
+                "id": entry_id,
+                "size": [w, h],
+                "text_layer_path": str(layer_copy),
+                "mask_path": str(mask_copy),
+                "fingerprint": self._fingerprint(rgba),
+            })
+            self._save_index(entries)
+        logger.info(f"Added text layer {entry_id} to the library ({len(entries)} entries)")
+        return entry_id
+
+    def _screen(self, entry: Dict[str, Any], probe_stack: np.ndarray) -> float:
+        """Fraction of the entry's fingerprint pixels whose median colour over the probes matches"""
+        fingerprint = entry["fingerprint"]
+        points = np.asarray(fingerprint["points"], dtype=np.int64).reshape(-1, 2)
+        if len(points) == 0:
+            return 0.0
+
+        # the median tolerates a few probes where compression or motion disturbs a pixel
+        values = probe_stack[:, points[:, 0], points[:, 1]].astype(np.float32)   # (P, K, 3)
+        distance = np.abs(np.median(values, axis=0) - np.asarray(fingerprint["colors"], np.float32)).max(axis=1)
+        return float((distance <= self.FP_COLOR_TOL).mean())
+
+    def _verify(self, entry: Dict[str, Any], probe_frames: List[np.ndarray]) -> float:
+        """Median fraction of text pixels that match the layer colour, over the probe frames"""
+        rgba = cv2.imread(entry["text_layer_path"], cv2.IMREAD_UNCHANGED)
+        text_idx = rgba[:, :, 3] > 0
+        layer = rgba[:, :, :3][text_idx].astype(np.int16)
+
+        fractions = []
+        for frame in probe_frames:
+            diff = np.abs(frame[text_idx].astype(np.int16) - layer).max(axis=1)
+            fractions.append(float((diff <= self.PIXEL_TOL).mean()))
+        return float(np.median(fractions))
+
+    def _extra_static_edges(self, entry: Dict[str, Any], probe_stack: np.ndarray) -> float:
+        """
+        Static edges outside the layer's (dilated) mask relative to those inside it, at proxy
+        scale: edges present in every probe frame belong to something screen-static
+        """
+        mask = cv2.imread(entry["mask_path"], cv2.IMREAD_GRAYSCALE)
+        h, w = probe_stack.shape[1:3]
+        size = (max(1, round(w * self.EXTRA_PROXY_SCALE)), max(1, round(h * self.EXTRA_PROXY_SCALE)))
+        layer = cv2.resize(mask, size, interpolation=cv2.INTER_AREA) > 0
+        layer = cv2.dilate(layer.astype(np.uint8), np.ones((3, 3), np.uint8), iterations=self.EXTRA_MASK_DILATE) > 0
+
+        static = np.ones(layer.shape, dtype=bool)
+        for frame in probe_stack:
+            gray = cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+            static &= cv2.Canny(gray, 100, 200) > 0
+
+        return float(static[~layer].sum()) / max(1, int(static[layer].sum()))
+
+    def match(self, probe_frames: List[np.ndarray]) -> Optional[Dict[str, Any]]:
+        """
+        Find a library layer that verifies against a handful of BGR frames of a new video
+
+        Args:
+            probe_frames: Frames sampled across the video (full resolution)
+
+        Returns:
+            Best verifying entry (with text_layer_path and mask_path), or None
+        """
+        if not probe_frames:
+            return None
+
+        h, w = probe_frames[0].shape[:2]
+        with self._locked():
+            entries = self._load_index()
+        candidates = [entry for entry in entries if entry["size"] == [w, h]]
+        if not candidates:
+            return None
+
+        probe_stack = np.stack(probe_frames)
+
+        best, best_score = None, 0.0
+        for entry in candidates:
+            try:
+                if self._screen(entry, probe_stack) < self.FP_MIN_SCORE:
+                    continue
+                score = self._verify(entry, probe_frames)
+                logger.info(f"Library layer {entry['id']} verified at {score:.1%}")
+                if score < self.MATCH_MIN or score <= best_score:
+                    continue
+                extra = self._extra_static_edges(entry, probe_stack)
+            except Exception as e:
+                logger.warning(f"Skipping broken library entry {entry.get('id')}: {str(e)}")
+                continue
+
+            if extra > self.EXTRA_EDGE_MAX:
+                logger.info(
+                    f"Library layer {entry['id']} rejected: the video has more static edges outside it "
+                    f"({extra:.0%} of those inside)"
+                )
+                continue
+            best, best_score = entry, score
+
+        return best
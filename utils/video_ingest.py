@@ -0,0 +1,100 @@
+"""Single-decode ingest: decodes a video once and fans the frames out to several consumers"""
+
+from typing import List
+
+import cv2
+import numpy as np
+
+from utils.logger import setup_logger
+from utils.mezzanine import load_frame_index
+
+logger = setup_logger(__name__)
+
+SEEK_MIN_GAP = 48  # frames; shorter gaps are decoded through instead of seeking (at most one GOP on a mezzanine)
+
+
+class FrameConsumer:
+    """
+    Interface of an ingest consumer. Frames are shared between consumers and must not be modified.
+    """
+
+    def last_frame(self) -> int:
+        """Last frame number the consumer needs (-1 if none)"""
+        raise NotImplementedError
+
+    def wants(self, frame_num: int) -> bool:
+        """Whether the frame should be decoded and handed to consume()"""
+        raise NotImplementedError
+
+    def next_wanted(self, frame_num: int) -> int:
+        """First frame >= frame_num the consumer wants (frame_num itself when not known in advance)"""
+        return frame_num
+
+    def consume(self, frame_num: int, frame: np.ndarray):
+        raise NotImplementedError
+
+    def close(self):
+        """Called once decoding is over (also on failure)"""
+
+
+class VideoIngest:
+    """
+    Decodes a video in one forward pass and hands every frame a consumer wants to that consumer.
+
+    Frames nobody wants are only grabbed (not converted), and decoding stops after the last
+    frame any consumer needs. With seek, long gaps nobody wants (see FrameConsumer.next_wanted)
+    are skipped with a seek instead of being decoded.
+    """
+
+    def __init__(self, video_path: str, seek: bool = False):
+        self.video_path = video_path
+        self.seek = seek
+        self.consumers: List[FrameConsumer] = []
+
+    def add(self, consumer):
+        """Registers a consumer (None is ignored) and returns it"""
+        if consumer is not None:
+            self.consumers.append(consumer)
+        return consumer
+
+    def run(self):
+        if not self.consumers:
+            return
+
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open video file: {self.video_path}")
+
+        last_frame = max(consumer.last_frame() for consumer in self.consumers)
+        logger.info(f"Ingesting frames 0-{last_frame} for {len(self.consumers)} consumer(s)")
+
+        # on a mezzanine a seek decodes at most one GOP, so it pays off for shorter gaps
+        frame_index = load_frame_index(self.video_path) if self.seek else None
+        seek_min_gap = min(SEEK_MIN_GAP, frame_index["gop"]) if frame_index else SEEK_MIN_GAP
+
+        try:
+            frame_num = 0
+            while frame_num <= last_frame:
+                if self.seek:
+                    target = min(consumer.next_wanted(frame_num) for consumer in self.consumers)
+                    if target > last_frame:
+                        break
+                    if target - frame_num > seek_min_gap:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                        frame_num = target
+                if not cap.grab():
+                    logger.info(f"Video ended at frame {frame_num}")
+                    break
+                consumers = [consumer for consumer in self.consumers if consumer.wants(frame_num)]
+                if consumers:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        logger.warning(f"Failed to decode frame {frame_num}")
+                        break
+                    for consumer in consumers:
+                        consumer.consume(frame_num, frame)
+                frame_num += 1
+        finally:
+            cap.release()
+            for consumer in self.consumers:
+                consumer.close()
@@ -0,0 +1,81 @@
+"""Stream parameters of a video file: ffprobe when available, OpenCV otherwise"""
+
+import asyncio
+import json
+import shutil
+from fractions import Fraction
+from typing import Any, Dict
+
+import cv2
+
+from utils.async_utils import run_process
+
+# OpenCV fourcc -> ffmpeg codec name (fallback without ffprobe)
+_FOURCC_CODECS = {"avc1": "h264", "h264": "h264", "hvc1": "hevc", "hev1": "hevc", "av01": "av1"}
+
+
+async def probe_video_stream(video_path: str, count_frames: bool = False) -> Dict[str, Any]:
+    """
+    Parameters of the first video stream
+
+    Args:
+        video_path: Path to the video
+        count_frames: Also count the frames (reads the whole stream)
+
+    Returns:
+        codec, width, height, rate (nominal frame rate as a fraction string), avg_rate (average
+        frame rate, the nominal one when unknown), time_base and pix_fmt (None without ffprobe),
+        and frame_count when requested
+    """
+    if shutil.which("ffprobe"):
+        entries = "stream=codec_name,width,height,r_frame_rate,avg_frame_rate,time_base,pix_fmt"
+        cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0"]
+        if count_frames:
+            cmd += ["-count_packets"]
+            entries += ",nb_read_packets"
+        cmd += ["-show_entries", entries, "-of", "json", str(video_path)]
+        pr = await run_process(cmd)
+        if pr.returncode == 0:
+            try:
+                stream = json.loads(pr.stdout or "{}")["streams"][0]
+                avg_rate = stream.get("avg_frame_rate", "0/0")
+                info = {
+                    "codec": stream["codec_name"],
+                    "width": int(stream["width"]),
+                    "height": int(stream["height"]),
+                    "rate": stream["r_frame_rate"],
+                    "avg_rate": stream["r_frame_rate"] if avg_rate in ("0/0", "0/1") else avg_rate,
+                    "time_base": stream.get("time_base"),
+                    "pix_fmt": stream.get("pix_fmt"),
+                }
+                if count_frames:
+                    info["frame_count"] = int(stream["nb_read_packets"])
+                return info
+            except Exception:
+                pass  # Non-fatal: fall back to OpenCV
+
+    return await asyncio.to_thread(_probe_video_stream_opencv, video_path, count_frames)
+
+
+def _probe_video_stream_opencv(video_path: str, count_frames: bool) -> Dict[str, Any]:
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video file: {video_path}")
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC)).to_bytes(4, "little").decode("ascii", "ignore").lower()
+    rate = str(Fraction(cap.get(cv2.CAP_PROP_FPS)).limit_denominator(1001))
+    info = {
+        "codec": _FOURCC_CODECS.get(fourcc, fourcc),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "rate": rate,
+        "avg_rate": rate,
+        "time_base": None,
+        "pix_fmt": None,
+    }
+    if count_frames:
+        frame_count = 0
+        while cap.grab():
+            frame_count += 1
+        info["frame_count"] = frame_count
+    cap.release()
+    return info